@@ -1,3 +1,128 @@
+from collections import OrderedDict
+
+
+# Bytes of grids evaluated kept in memory, least recently used
+# dropped first, larger grids not kept, and directory of .npy files
+# for expressions grids, None disabled.
+grid_cache_bytes = 256 << 20
+grid_cache_dir = None
+
+_functions = OrderedDict()
+_grids = OrderedDict()
+
+
+def _cached(cache, key):
+    # Cache value moved to most recently used, KeyError if missing
+    value = cache[key]
+    cache.move_to_end(key)
+    return value
+
+
+def _store(cache, key, value, size):
+    cache[key] = value
+    if len(cache) > size:
+        cache.popitem(last=False)
+    return value
+
+
+def _store_grid(key, value):
+    # _grids bounded by R bytes
+    nbytes = value[2].nbytes
+    if nbytes > grid_cache_bytes:
+        return value
+    _grids[key] = value
+    total = sum(R.nbytes for X, Y, R in _grids.values())
+    while total > grid_cache_bytes:
+        total -= _grids.popitem(last=False)[1][2].nbytes
+    return value
+
+
+def _function(expr):
+    # expr lambdified once, functions as they are
+    if not hasattr(expr, 'atoms'):
+        return expr
+    from sympy import lambdify, Symbol
+    try:
+        return _cached(_functions, expr)
+    except KeyError:
+        var = list(expr.atoms(Symbol))[0]
+        return _store(_functions, expr, lambdify(var, expr, 'numpy'), 64)
+
+
+def grid(expr, xlim = [-1, 1], ylim = [-1, 1], points = 50, dtype = None):
+    """
+    X, Y meshgrid and R = f(X + 1j*Y) of cplot3d, cached by (expr,
+    xlim, ylim, points, dtype) up to grid_cache_bytes. Expressions
+    grids are also saved to grid_cache_dir, if set, as .npy files.
+
+       dtype  - R type, default complex128 up to 1024 points,
+                complex64 over it.
+
+    R is preallocated and evaluated by tiles on a thread pool, see
+    evaluate. X and Y are broadcast views of the axes, no memory.
+    """
+    from numpy import arange, broadcast_to, empty, load, save
+    if dtype is None:
+        dtype = "complex128" if points <= 1024 else "complex64"
+    key = (expr, tuple(xlim), tuple(ylim), points, dtype)
+    try:
+        return _cached(_grids, key)
+    except KeyError:
+        pass
+    # Obtain X(real), Y(real), Z(imaginary)
+    xs = arange(xlim[0], xlim[1], (xlim[1]-xlim[0])/(points-1))
+    ys = arange(ylim[0], ylim[1], (ylim[1]-ylim[0])/(points-1))
+    X = broadcast_to(xs, (len(ys), len(xs)))
+    Y = broadcast_to(ys[:, None], (len(ys), len(xs)))
+    path = None
+    if grid_cache_dir is not None and hasattr(expr, 'atoms'):
+        from hashlib import sha1
+        from os import makedirs
+        from os.path import exists, join
+        from sympy import srepr
+        makedirs(grid_cache_dir, exist_ok=True)
+        path = join(grid_cache_dir, sha1(repr((srepr(expr), ) + key[1:]).encode()).hexdigest() + ".npy")
+        if exists(path):
+            return _store_grid(key, (X, Y, load(path)))
+    R = evaluate(_function(expr), xs, ys, empty((len(ys), len(xs)), dtype))
+    if path is not None:
+        save(path, R)
+    return _store_grid(key, (X, Y, R))
+
+
+def evaluate(Fz, xs, ys, out, tile = 256, workers = None):
+    """
+    out[i, j] = Fz(xs[j] + 1j*ys[i]) by tile x tile blocks on a thread
+    pool, NumPy releases the GIL. Temporaries are per tile, peak
+    memory is out plus a few tiles per worker.
+    """
+    def block(i, j):
+        out[i:i + tile, j:j + tile] = Fz(xs[j:j + tile] + 1j*ys[i:i + tile, None])
+
+    _tiles(out.shape, tile, block, workers)
+    return out
+
+
+def _tiles(shape, tile, block, workers = None):
+    # block(i, j) for every tile x tile block origin of shape, on a
+    # thread pool. Raises blocks' exceptions.
+    from concurrent.futures import ThreadPoolExecutor
+    origins = [(i, j) for i in range(0, shape[0], tile) for j in range(0, shape[1], tile)]
+    if len(origins) == 1 or workers == 1:
+        for i, j in origins:
+            block(i, j)
+        return
+    with ThreadPoolExecutor(workers) as pool:
+        for result in pool.map(lambda origin: block(*origin), origins):
+            pass
+
+
+def clear_cache():
+    # Memory caches, .npy files stay
+    _functions.clear()
+    _grids.clear()
+
+
 def cplot3d(expr, xlim = [-1, 1], ylim = [-1, 1], points = 50, type = "real-imag", style = "color"):
     """
     Plot complex expressions or functions.
@@ -10,55 +135,64 @@ def cplot3d(expr, xlim = [-1, 1], ylim = [-1, 1], points = 50, type = "real-imag
                    Opctions: "mod-arg" "real-arg" "arg-real" "real-imag"
        style     - "color": color plot.
                    others: double plot.
+
+    Lambdified expressions and evaluated grids are cached, see grid.
+    Over 1024 points grids are complex64. Plotted values and colors
+    are float32 arrays filled by tiles, no full size temporaries.
+    Matplotlib surface polygons are still one per point.
     """
 
     # Dependences
     from mpl_toolkits.mplot3d import Axes3D
     from matplotlib import cm
     import matplotlib.pyplot as plt
-    from numpy import arange, array, meshgrid, size, absolute, angle
-    from sympy import lambdify, Symbol
-    
-    # Expressions to functions
-    if hasattr(expr, 'atoms'):
-        var = list(expr.atoms(Symbol))[0]
-        Fz=lambdify(var, expr, 'numpy')
-    else:
-        Fz=expr
+    from numpy import absolute, angle, real, imag, empty, float32
 
-    # Obtain X(real), Y(real), Z(imaginary)
-    X = arange(xlim[0], xlim[1], (xlim[1]-xlim[0])/(points-1))
-    Y = arange(ylim[0], ylim[1], (ylim[1]-ylim[0])/(points-1))
-    X, Y = meshgrid(X, Y)
-    R=Fz(X + 1j*Y)
+    # Evaluated grid, cached. Changing only type or style reuses it.
+    X, Y, R = grid(expr, xlim, ylim, points)
 
     # Select type
     if type == "mod-arg":
-        Z = absolute(R)
-        T = angle(R)
+        fz, ft = absolute, angle
         zlabel = "abs(f(z))"
         keyhue = "arg(f(z))"
     elif type == "real-arg":
-        Z = R.real
-        T = angle(R)
+        fz, ft = real, angle
         zlabel = "Re(f(z))"
         keyhue = "arg(f(z))"
     elif type == "arg-real":
-        Z = angle(R)
-        T = R.real
+        fz, ft = angle, real
         zlabel = "arg(f(z))"
         keyhue = "Re(f(z))"
     elif type == "real-imag":
-        Z = R.real
-        T = R.imag
+        fz, ft = real, imag
         zlabel = "Re(f(z))"
         keyhue = "Im(f(z))"
 
+    # Z and T by tiles of R
+    tile = 256
+    Z = empty(R.shape, float32)
+    T = empty(R.shape, float32)
+
+    def parts(i, j):
+        r = R[i:i + tile, j:j + tile]
+        Z[i:i + tile, j:j + tile] = fz(r)
+        T[i:i + tile, j:j + tile] = ft(r)
+
+    _tiles(R.shape, tile, parts)
+
 
     # Select style
     if style == "color":
-        #  Normalize. hue in [0, 1]
-        N = (T - T.min())/(T.max() - T.min())
+        #  Normalize. hue in [0, 1], colors by tiles
+        low, high = T.min(), T.max()
+        C = empty(R.shape + (4,), float32)
+
+        def colors(i, j):
+            C[i:i + tile, j:j + tile] = cm.jet((T[i:i + tile, j:j + tile] - low)/(high - low))
+
+        # Colormaps aren't thread safe
+        _tiles(R.shape, tile, colors, 1)
 
         # Setup the plot
         fig = plt.figure()
@@ -69,7 +203,7 @@ def cplot3d(expr, xlim = [-1, 1], ylim = [-1, 1], points = 50, type = "real-imag
         ax.set_zlabel('$\mathrm{'+zlabel+'}$')
         surf = ax.plot_surface(
             X, Y, Z, rstride=1, cstride=1,
-            facecolors=cm.jet(N),
+            facecolors=C,
             linewidth=0, antialiased=True, shade=False)
 
         # Show the leyend
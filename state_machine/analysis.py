@@ -0,0 +1,181 @@
+from inspect import isclass
+
+from state_machine import Machine, Start, Message, Graph, node_format
+
+
+class Report:
+    """
+    Static analysis of a machine transitions graph.
+
+       machine      - machine type.
+       missing      - Start missing in machine transitions.
+       states       - {state type: set of reachable state types}.
+       unreachable  - states not reachable from Start.
+       dead_ends    - reachable states without transitions out of them.
+       undefined    - (state, event, target) targets not in states.
+       invalid      - (state, event, value) neither state nor callable.
+       shadowed     - (state, event, target) upper events bound to a
+                      class. Upper machine handles them, never reached.
+       children     - reports of sub-machines.
+    """
+    def __init__(self, machine):
+        self.machine = machine
+        self.missing = False
+        self.states = {}
+        self.unreachable = []
+        self.dead_ends = []
+        self.undefined = []
+        self.invalid = []
+        self.shadowed = []
+        self.children = []
+
+    @property
+    def errors(self):
+        # Problems making machine fail at runtime
+        return bool(self.missing or self.undefined or self.invalid or self.shadowed
+                    or any(child.errors for child in self.children))
+
+    @property
+    def ok(self):
+        return not (self.errors or self.unreachable or self.dead_ends
+                    or any(not child.ok for child in self.children))
+
+    def __str__(self):
+        lines = [node_format(self.machine) + ":"]
+        if self.missing:
+            lines.append("  missing: Start")
+        for name in ("unreachable", "dead_ends"):
+            if getattr(self, name):
+                lines.append("  " + name + ": " + str(Graph(getattr(self, name))))
+        for name in ("undefined", "invalid", "shadowed"):
+            for state, event, value in getattr(self, name):
+                lines.append("  " + name + ": " + node_format(state) + " "
+                             + node_format(event) + ": " + node_format(value))
+        for child in self.children:
+            lines.extend("  " + line for line in str(child).splitlines())
+        return "\n".join(lines)
+
+
+def analyze(machine, machine_type=None):
+    """
+    Analyze a Machine instance, nested machines included, or the
+    transitions dict form {Machine: {...}, State: {...}}. Dict form
+    machine_type defaults to the only Machine key whose Start points
+    to another key. Other Machine keys are sub-machines.
+    """
+    if isinstance(machine, Machine):
+        report = _analyze(type(machine), machine.transitions,
+                          {state_type: getattr(state, "transitions", {})
+                           for state_type, state in machine._states.items()},
+                          {state_type for state_type, state in machine._states.items()
+                           if isinstance(state, Machine)})
+        for state in machine._states.values():
+            if isinstance(state, Machine):
+                report.children.append(analyze(state))
+        return report
+    transitions = dict(machine)
+    if machine_type is None:
+        # Sub-machines' Start points out of this dict
+        candidates = [key for key, table in transitions.items()
+                      if _is_machine(key) and table.get(Start) in transitions]
+        if len(candidates) != 1:
+            raise ValueError(Message("Machine type: ", Graph(candidates), " pass machine_type"))
+        machine_type = candidates[0]
+    machine_transitions = transitions.pop(machine_type)
+    return _analyze(machine_type, machine_transitions, transitions,
+                    {state_type for state_type in transitions if _is_machine(state_type)})
+
+
+def _is_machine(state_type):
+    return isclass(state_type) and issubclass(state_type, Machine)
+
+
+def _analyze(machine_type, transitions, states, machines):
+    report = Report(machine_type)
+    upper = {event for event in transitions if not isinstance(event, tuple)}
+    for state_type, table in states.items():
+        targets = report.states[state_type] = set()
+        for event, value in table.items():
+            if isinstance(event, tuple):
+                continue
+            if event in upper:
+                # Sub-machines' Start is their own first state
+                if isclass(value) and not (event is Start and state_type in machines):
+                    report.shadowed.append((state_type, event, value))
+            elif value is machine_type:
+                targets.add(machine_type)
+            elif isclass(value):
+                if value in states:
+                    targets.add(value)
+                else:
+                    report.undefined.append((state_type, event, value))
+            elif not callable(value) and state_type not in machines:
+                # Sub-machines' own upper events may have no function
+                report.invalid.append((state_type, event, value))
+    first = transitions.get(Start)
+    if first is None:
+        report.missing = True
+        return report
+    if first not in states:
+        report.undefined.append((machine_type, Start, first))
+        return report
+    reached = {first}
+    pending = [first]
+    while pending:
+        for target in report.states[pending.pop()]:
+            if target in states and target not in reached:
+                reached.add(target)
+                pending.append(target)
+    report.unreachable = [state_type for state_type in states if state_type not in reached]
+    report.dead_ends = [state_type for state_type in states
+                        if state_type in reached and not report.states[state_type] - {state_type}]
+    return report
+
+
+def validate(machine):
+    # Analyze machine and compile it and its sub-machines ahead of
+    # start. Raises ValueError if analysis finds runtime errors.
+    # Compiled tables are the fast path, there is no validated loop:
+    # the KeyError and FAIL branches cost nothing unless taken.
+    report = analyze(machine)
+    if report.errors:
+        raise ValueError(Message("Invalid machine:\n", report))
+    for prefix, nested in machine._machines_():
+        nested.compile()
+    return report
+
+
+if __name__ == "__main__":
+    from state_machine import Event, State, Exit
+
+    class Next(Event):
+        pass
+
+    class Yes(Event):
+        pass
+
+    class No(Event):
+        pass
+
+    class Startup(State):
+        pass
+
+    class AbortCondition(State):
+        pass
+
+    class Orphan(State):
+        pass
+
+    class Mutex(Machine):
+        pass
+
+    class Starter(Machine):
+        pass
+
+    print(analyze({
+        Startup: {Next: AbortCondition},
+        AbortCondition: {No: Mutex, Yes: Starter},
+        Mutex: {Start: Startup, Exit: AbortCondition},
+        Orphan: {Next: Startup, Start: Startup},
+        Starter: {Start: Startup}
+    }, Starter))
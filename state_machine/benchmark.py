@@ -0,0 +1,421 @@
+from collections import deque
+from inspect import isclass
+from queue import Queue
+from time import perf_counter
+
+from state_machine import Event, State, Machine, Start, Exit, StopMachine, QueueBatcher, PooledEvent, Inbox
+
+
+class Ping(Event):
+    pass
+
+
+class Pong(Event):
+    pass
+
+
+class Tick(Event):
+    pass
+
+
+class Stop(Event):
+    pass
+
+
+class Left(State):
+    def __init__(self):
+        super().__init__()
+        self.transitions = {Ping: Right, Tick: lambda event: None}
+
+    def _enter_(self, event, from_state):
+        pass
+
+
+class Right(State):
+    def __init__(self):
+        super().__init__()
+        self.transitions = {Pong: Left, Tick: lambda event: None}
+
+    def _enter_(self, event, from_state):
+        pass
+
+
+class Bench(Machine):
+    def __init__(self, states):
+        super().__init__(states)
+        self.transitions = {Start: Left, Stop: None}
+
+
+def feed(events):
+    # Half of the events change state, the other half call
+    # a function in current state
+    return (Tick(), Ping(), Tick(), Pong()) * (events // 4)
+
+
+def run(machine, events):
+    begin = perf_counter()
+    machine.start()
+    return events / (perf_counter() - begin)
+
+
+class Lookup(Machine):
+    # Reference loop before compiled dispatch tables: machine and
+    # state transitions looked up per event
+    def _enter_(self, event, from_state):
+        try:
+            self._state = self._states[self.transitions[Start]]
+            self._state._enter_(Start(event), self)
+        except StopMachine as e:
+            self._exit_(e.event, None, None)
+            return
+        while True:
+            try:
+                try:
+                    event = self.fetch()
+                    if event is None:
+                        continue
+                    event_type = type(event)
+                    if event_type in self.transitions:
+                        if event_type in self._state.transitions:
+                            function = self._state.transitions[event_type]
+                            if isclass(function):
+                                raise ValueError("Upper event: " + event_type.__name__)
+                            function(event)
+                        raise StopMachine(event)
+                    function_or_type = self._state.transitions[event_type]
+                    if function_or_type is self._type:
+                        raise StopMachine(event)
+                    elif isclass(function_or_type):
+                        state_type = function_or_type
+                    elif callable(function_or_type):
+                        function_or_type(event)
+                        continue
+                    else:
+                        raise TypeError("Neither function nor state: " + str(function_or_type))
+                    state = self._states[state_type]
+                except StopMachine as e:
+                    self._state._exit_(e.event, self, None)
+                    raise
+                except BaseException as e:
+                    if self._state._exit_(None, self, e) is None:
+                        raise
+                else:
+                    self._state._exit_(event, state, None)
+                from_state = self._state
+                self._state = None
+                transition = (type(from_state), state_type)
+                if transition in from_state.transitions:
+                    from_state.transitions[transition](event, from_state, state)
+                self._state = state
+                self._state._enter_(event, from_state)
+            except StopMachine as e:
+                self._exit_(e.event, self, None)
+                return
+
+
+def dispatch(events=200000):
+    # Events per second through the machine loop, per event lookups
+    # against compiled dispatch tables
+    rates = []
+    for loop in (Lookup, Machine):
+        queue = deque(feed(events))
+
+        class Deque(Bench, loop):
+            def fetch(self):
+                try:
+                    return queue.popleft()
+                except IndexError:
+                    raise StopMachine(None)
+
+        rates.append(run(Deque([Left(), Right()]), len(queue)))
+    return tuple(rates)
+
+
+def batched(events=200000):
+    # Events per second from a backed up queue.Queue,
+    # one get() per event against fetch_many() batches
+    queue = Queue()
+    for event in feed(events) + (Stop(),):
+        queue.put(event)
+
+    class Single(Bench):
+        def fetch(self):
+            return queue.get()
+
+    single = run(Single([Left(), Right()]), queue.qsize())
+
+    source = QueueBatcher(size=1024)
+    for event in feed(events) + (Stop(),):
+        source.notify(event)
+
+    class Batched(Bench):
+        def fetch_many(self):
+            return source.fetch_many()
+
+    return single, run(Batched([Left(), Right()]), source.queue.qsize())
+
+
+class Value(Event):
+    def __init__(self, n):
+        self.n = n
+
+
+class Idle(State):
+    def _enter_(self, event, from_state):
+        pass
+
+
+class Counter(State):
+    def __init__(self):
+        super().__init__()
+        self.n = 0
+        self.transitions = {Tick: self.tick, Ping: Idle}
+
+    def _enter_(self, event, from_state):
+        pass
+
+    def tick(self, event):
+        self.n += 1
+        self.notify_all(Value(self.n))
+
+
+class Recover(Machine):
+    def __init__(self, queue):
+        super().__init__([Counter(), Idle()])
+        self.transitions = {Start: Counter}
+        self.notifiers = {Value: ("n", "n")}
+        self.queue = queue
+
+    def fetch(self):
+        try:
+            return self.queue.popleft()
+        except IndexError:
+            raise StopMachine(None)
+
+
+def recover(history=200000):
+    # Seconds to rebuild machine state replaying whole history
+    # against restoring its snapshot
+    machine = Recover(deque((Tick(),) * history + (Ping(),)))
+    begin = perf_counter()
+    machine.start()
+    replay = perf_counter() - begin
+    snapshot = machine.snapshot()
+    machine = Recover(deque())
+    begin = perf_counter()
+    machine.restore(snapshot).resume()
+    restore = perf_counter() - begin
+    assert machine.n == history and type(machine._state) is Idle
+    return replay, restore, len(snapshot)
+
+
+class SlotValue(Event):
+    __slots__ = ("n",)
+
+    def __init__(self, n):
+        self.n = n
+
+
+class Observer(Machine):
+    def __init__(self):
+        super().__init__([Idle()])
+        self.transitions = {Start: Idle}
+        self.notifiers = {Value: ("n", "n"), SlotValue: ("n", "n"), Tick: lambda event: None}
+
+
+def fanout(observers=16, events=20000):
+    # Notifications per second from one state to many machines,
+    # calling every observer's notify against pre-bound notify_all
+    subject = State()
+    for i in range(observers):
+        subject.register(Observer())
+    rates = []
+    for event in (Value(1), SlotValue(1), Tick()):
+        begin = perf_counter()
+        for i in range(events):
+            for observer in subject._observers:
+                observer.notify(event)
+        notify = perf_counter() - begin
+        begin = perf_counter()
+        for i in range(events):
+            subject.notify_all(event)
+        rates.append((events * observers / notify,
+                      events * observers / (perf_counter() - begin)))
+    return rates
+
+
+class PooledValue(PooledEvent):
+    __slots__ = ("n",)
+
+    def __init__(self, n):
+        self.n = n
+
+
+class Sink(State):
+    def __init__(self):
+        super().__init__()
+        self.transitions = {SlotValue: self.value, PooledValue: self.value}
+
+    def _enter_(self, event, from_state):
+        pass
+
+    def value(self, event):
+        pass
+
+
+class Producer(Machine):
+    def __init__(self, make, events):
+        super().__init__([Sink()])
+        self.transitions = {Start: Sink}
+        self.make = make
+        self.events = events
+
+    def fetch(self):
+        if not self.events:
+            raise StopMachine(None)
+        self.events -= 1
+        return self.make(self.events)
+
+
+def memory(events=100000):
+    # tracemalloc bytes of a backlog of events with __dict__ and with
+    # __slots__, then garbage collections, peak bytes and events per
+    # second of a machine handling new __slots__ events against pooled
+    # events with the same __slots__.
+    from gc import get_stats
+    import tracemalloc
+    backlog = []
+    for make in (Value, SlotValue):
+        tracemalloc.start()
+        events_ = [make(i) for i in range(events)]
+        backlog.append(tracemalloc.get_traced_memory()[0])
+        tracemalloc.stop()
+        del events_
+    machines = []
+    for make in (SlotValue, PooledValue.acquire):
+        machine = Producer(make, events)
+        collections = get_stats()[0]["collections"]
+        tracemalloc.start()
+        machine.start()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        machines.append((get_stats()[0]["collections"] - collections, peak,
+                         run(Producer(make, events), events)))
+    return backlog, machines
+
+
+class Up(Event):
+    pass
+
+
+class Level(Machine):
+    # Machine nesting the level below. Exit from it is queued next,
+    # Exit(Stop) goes on up as Stop.
+    def __init__(self, child, queue):
+        super().__init__([child])
+        self.transitions = {Start: type(child), Stop: None}
+        if not isinstance(child, Machine):
+            # Deepest machine stops on Up
+            self.transitions[Up] = None
+        elif Up in child.transitions:
+            # and the one above enters it again
+            child.transitions[Exit] = type(child)
+        self.notifiers = {Exit: lambda event: queue.appendleft(
+            event.event if type(event.event) is Stop else event)}
+        self.queue = queue
+
+    def fetch(self):
+        try:
+            return self.queue.popleft()
+        except IndexError:
+            raise StopMachine(None)
+
+
+def tower(depth, queue):
+    # depth machines nested, the deepest one in Idle
+    machine = Idle()
+    for level in range(depth):
+        machine = type("Level%d" % level, (Level,), {})(machine, queue)
+    return machine
+
+
+def nested(depth=100, events=20000):
+    # Events per second stopping the deepest machine, entered again
+    # by the one above, and deepest tower started and stopped within
+    # the recursion limit, recursive against flat driver
+    results = []
+    for flat in (False, True):
+        Machine.flat = flat
+        queue = deque((Up(),) * events + (Stop(),))
+        rate = run(tower(depth, queue), events)
+        deepest = 0
+        for height in (100, 1000, 10000):
+            try:
+                tower(height, deque([Stop()])).start()
+            except RecursionError:
+                break
+            deepest = height
+        results.append((rate, deepest))
+    Machine.flat = False
+    return results
+
+
+class Busy(State):
+    def __init__(self):
+        super().__init__()
+        self.transitions = {Tick: self.tick}
+
+    def _enter_(self, event, from_state):
+        pass
+
+    def tick(self, event):
+        for i in range(20):
+            pass
+
+
+def backpressure(events=100000, capacity=1024):
+    # Producer thread outrunning a machine: events per second, inbox
+    # high water mark and dropped events, unbounded against bounded
+    # blocking and dropping oldest
+    from threading import Thread
+    results = []
+    for inbox in (Inbox(), Inbox(capacity), Inbox(capacity, "drop_oldest")):
+        class Consumer(Machine):
+            def __init__(self):
+                super().__init__([Busy()])
+                self.transitions = {Start: Busy, Stop: None}
+
+            def fetch_many(self):
+                return inbox.fetch_many()
+
+        def produce():
+            for i in range(events):
+                inbox.notify(Tick())
+            # Blocks, never dropped, if Tick events were
+            inbox.policy = "block"
+            inbox.notify(Stop())
+
+        producer = Thread(target=produce)
+        begin = perf_counter()
+        producer.start()
+        Consumer().start()
+        producer.join()
+        stats = inbox.stats()
+        results.append((events / (perf_counter() - begin), stats["high"], stats["dropped"]))
+    return results
+
+
+if __name__ == "__main__":
+    print("dispatch: lookup %.0f events/s   compiled %.0f events/s" % dispatch())
+    print("fetch: %.0f events/s   fetch_many: %.0f events/s" % batched())
+    for name, (notify, notify_all) in zip(("tuple", "slots tuple", "function"), fanout()):
+        print("%s notifier: notify %.0f/s   notify_all %.0f/s" % (name, notify, notify_all))
+    (dicts, slots), (new, pooled) = memory()
+    print("backlog: __dict__ %d bytes   __slots__ %d bytes" % (dicts, slots))
+    print("new slot events: %d collections %d peak bytes %.0f events/s" % new)
+    print("pooled slot events: %d collections %d peak bytes %.0f events/s" % pooled)
+    print("replay: %.6fs   restore: %.6fs   snapshot: %d bytes" % recover())
+    for name, result in zip(("recursive", "flat"), nested()):
+        print("%s: %.0f re-entries/s at depth 100   deepest: %d" % ((name,) + result))
+    for name, result in zip(("unbounded", "block", "drop_oldest"), backpressure()):
+        print("%s inbox: %.0f events/s   high: %d   dropped: %d" % ((name,) + result))
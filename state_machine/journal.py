@@ -0,0 +1,276 @@
+from collections import deque
+from mmap import mmap, ACCESS_READ
+from os import listdir, makedirs
+from os.path import join, getsize
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from struct import Struct
+
+from state_machine import StopMachine
+
+
+# Record: total size, header included, and type id. Zero size ends
+# segment. Type id 0 declares next type id as "module:qualname".
+HEADER = Struct("<IH")
+DECLARE = 0
+
+
+def _attributes(event):
+    # Event attributes, __dict__ or __slots__
+    if hasattr(event, "__dict__"):
+        return event.__dict__
+    return {name: getattr(event, name)
+            for cls in type(event).__mro__ for name in getattr(cls, "__slots__", ())
+            if hasattr(event, name)}
+
+
+def _type(name):
+    from importlib import import_module
+    module, qualname = name.split(":")
+    item = import_module(module)
+    for attr in qualname.split("."):
+        item = getattr(item, attr)
+    return item
+
+
+def _segments(directory):
+    return sorted(name for name in listdir(directory) if name.endswith(".log"))
+
+
+def _records(directory):
+    # (segment index, position after record, type id, payload)
+    for index, name in enumerate(_segments(directory)):
+        path = join(directory, name)
+        if not getsize(path):
+            continue
+        with open(path, "rb") as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+            position = 0
+            end = len(data) - HEADER.size
+            while position <= end:
+                size, type_id = HEADER.unpack_from(data, position)
+                if not size:
+                    break
+                payload = data[position + HEADER.size:position + size]
+                position += size
+                yield index, position, type_id, payload
+
+
+def events(directory):
+    # Journal events in order
+    types = [None]
+    for index, position, type_id, payload in _records(directory):
+        if type_id == DECLARE:
+            types.append(_type(payload.decode()))
+            continue
+        event_type = types[type_id]
+        event = event_type.__new__(event_type)
+        if payload:
+            for name, value in loads(payload).items():
+                setattr(event, name, value)
+        yield event
+
+
+class Journal:
+    """
+    Append only event log on memory mapped, preallocated segments.
+
+       directory     - segments directory, created if missing. An
+                       existing journal is continued.
+       segment_size  - bytes per segment file.
+       sync_every    - records between flushes of mapped pages.
+
+    Records are event type id plus pickled event attributes, none for
+    events without attributes. wrap(machine) journals every event its
+    machines fetch.
+    """
+    def __init__(self, directory, segment_size=1 << 24, sync_every=1024):
+        makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_every = sync_every
+        self._types = {}
+        self._views = {}
+        self._unsynced = 0
+        self._file = self._map = None
+        segment, self._position = None, 0
+        for segment, self._position, type_id, payload in _records(directory):
+            if type_id == DECLARE:
+                self._types[_type(payload.decode())] = len(self._types) + 1
+        if segment is None:
+            segment = len(_segments(directory))
+        self._open(segment, 0)
+
+    def _open(self, segment, size):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+        self._segment = segment
+        path = join(self.directory, "%08d.log" % segment)
+        self._file = open(path, "a+b")
+        size = max(self.segment_size, size, getsize(path))
+        self._file.truncate(size)
+        self._map = mmap(self._file.fileno(), size)
+
+    def _write(self, type_id, payload):
+        size = HEADER.size + len(payload)
+        if self._position + size + HEADER.size > len(self._map):
+            # Next segment. Keeps a zero header ending this one.
+            self._open(self._segment + 1, size + HEADER.size)
+            self._position = 0
+        HEADER.pack_into(self._map, self._position, size, type_id)
+        self._map[self._position + HEADER.size:self._position + size] = payload
+        self._position += size
+
+    def append(self, event):
+        event_type = type(event)
+        try:
+            type_id = self._types[event_type]
+        except KeyError:
+            type_id = self._types[event_type] = len(self._types) + 1
+            self._write(DECLARE, (event_type.__module__ + ":" + event_type.__qualname__).encode())
+        attributes = _attributes(event)
+        self._write(type_id, dumps(attributes, HIGHEST_PROTOCOL) if attributes else b"")
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        self._map.flush()
+        self._unsynced = 0
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def wrap(self, machine):
+        # Journal events fetched by machine and its sub-machines
+        for prefix, nested in machine._machines_():
+            fetch = nested.fetch
+
+            def journaled(fetch=fetch):
+                event = fetch()
+                if event is not None:
+                    self.append(event)
+                return event
+            nested.fetch = journaled
+            fetch_many = getattr(nested, "fetch_many", None)
+            if fetch_many is not None:
+                nested.fetch_many = _Many(self, fetch_many)
+        return machine
+
+
+class _Many:
+    # Journals batch events as machines pop them. Deques shared by
+    # nested machines get one journaled view per deque, so each event
+    # is journaled once whatever machine pops it.
+    def __init__(self, journal, fetch_many):
+        self.journal = journal
+        self.fetch_many = fetch_many
+
+    def __call__(self):
+        pending = self.fetch_many()
+        if not isinstance(pending, deque):
+            # Machines raise TypeError
+            return pending
+        views = self.journal._views
+        view = views.get(id(pending))
+        if view is None or view.source is not pending:
+            view = views[id(pending)] = _Journaled(self.journal, pending)
+        return view
+
+
+class _Journaled(deque):
+    # Source deque view, popleft journals popped events
+    def __init__(self, journal, source):
+        super().__init__()
+        self.append_event = journal.append
+        self.source = source
+
+    def __len__(self):
+        return len(self.source)
+
+    def popleft(self):
+        event = self.source.popleft()
+        if event is not None:
+            self.append_event(event)
+        return event
+
+
+class Replay:
+    """
+    Feed journal events back through machines' fetch at full speed.
+    wrap(machine) replaces fetch and fetch_many of machine and its
+    sub-machines. Machines stop, StopMachine, at journal end.
+    """
+    def __init__(self, directory, batch=1024):
+        self.events = events(directory)
+        self.batch = batch
+        self.pending = deque()
+
+    def fetch(self):
+        if self.pending:
+            return self.pending.popleft()
+        for event in self.events:
+            return event
+        raise StopMachine(None)
+
+    def fetch_many(self):
+        pending = self.pending
+        if not pending:
+            for event in self.events:
+                pending.append(event)
+                if len(pending) >= self.batch:
+                    break
+            else:
+                if not pending:
+                    raise StopMachine(None)
+        return pending
+
+    def wrap(self, machine):
+        for prefix, nested in machine._machines_():
+            nested.fetch = self.fetch
+            nested.fetch_many = self.fetch_many
+        return machine
+
+
+if __name__ == "__main__":
+    from pickle import dump
+    from tempfile import TemporaryDirectory
+    from time import perf_counter
+    from benchmark import Recover, Tick, Ping, Value
+
+    history = 200000
+    with TemporaryDirectory() as directory:
+        # Journal against one pickle.dump per event
+        begin = perf_counter()
+        with open(join(directory, "events.pickle"), "wb") as f:
+            for i in range(history):
+                dump(Value(i), f, HIGHEST_PROTOCOL)
+        pickled = perf_counter() - begin
+        begin = perf_counter()
+        with Journal(join(directory, "values")) as journal:
+            for i in range(history):
+                journal.append(Value(i))
+        print("append: pickle.dump %.0f events/s   journal %.0f events/s"
+              % (history / pickled, history / (perf_counter() - begin)))
+
+        # Record a machine run, then rebuild its state from the journal
+        machine = Recover(deque((Tick(),) * history + (Ping(),)))
+        with Journal(join(directory, "run")) as journal:
+            begin = perf_counter()
+            journal.wrap(machine).start()
+            print("journaled run: %.0f events/s" % (history / (perf_counter() - begin)))
+        replayed = Replay(join(directory, "run")).wrap(Recover(deque()))
+        begin = perf_counter()
+        replayed.start()
+        print("replay: %.0f events/s" % (history / (perf_counter() - begin)))
+        assert replayed.n == machine.n and type(replayed._state) is type(machine._state)
@@ -0,0 +1,305 @@
+from asyncio import run_coroutine_threadsafe
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count
+from queue import Queue, Empty
+from threading import Thread
+from time import perf_counter
+
+from state_machine import Event, State, Start, StopMachine, Machine, AsyncMachine
+
+
+STOP = None  # Stop sentinel through shards' inboxes
+
+
+class ShardedRunner:
+    """
+    Run many independent machines, one per key, sharded across
+    worker processes.
+
+       factory   - picklable callable, factory(key) returns a top level
+                   Machine or AsyncMachine. Workers fork where
+                   available, otherwise factory and what it builds
+                   must be importable, defined at module level. fetch of every nested
+                   machine, and notify where overridden, are replaced
+                   by the key inbox.
+       shards    - worker processes, default cpu_count().
+       route     - route(key) -> shard index, default hash(key) % shards.
+       batch     - events buffered per shard before sending. flush()
+                   sends pending events.
+       interval  - seconds between workers' metrics updates.
+
+    Each worker runs Machines on threads and AsyncMachines as tasks of
+    one event loop, thousands of sessions without a thread each, fed
+    from per key queues. stop() makes every machine's fetch raise
+    StopMachine. factory or machine errors are reported per key.
+    """
+    def __init__(self, factory, shards=None, route=None, batch=1, interval=0.5):
+        self.factory = factory
+        self.shards = shards or cpu_count() or 1
+        self.route = route or (lambda key: hash(key) % self.shards)
+        self.batch = batch
+        self.interval = interval
+        self._futures = None
+
+    def start(self):
+        context = get_context("fork") if "fork" in get_all_start_methods() else get_context()
+        self._manager = context.Manager()
+        self._inboxes = [self._manager.Queue() for i in range(self.shards)]
+        self._stats = self._manager.dict()
+        self._buffers = [[] for i in range(self.shards)]
+        self._routed = [0] * self.shards
+        self._executor = ProcessPoolExecutor(self.shards, context)
+        self._futures = [
+            self._executor.submit(_shard, index, self.factory, inbox, self._stats, self.interval)
+            for index, inbox in enumerate(self._inboxes)]
+        self._begin = perf_counter()
+        return self
+
+    def put(self, key, event):
+        index = self.route(key)
+        buffer = self._buffers[index]
+        buffer.append((key, event))
+        self._routed[index] += 1
+        if len(buffer) >= self.batch:
+            self._inboxes[index].put(buffer)
+            self._buffers[index] = []
+
+    def flush(self):
+        for index, buffer in enumerate(self._buffers):
+            if buffer:
+                self._inboxes[index].put(buffer)
+                self._buffers[index] = []
+
+    def metrics(self):
+        # Per shard routed and processed events, machines, queue depth
+        # (batches in inbox) and overall processed events per second.
+        # After stop() the shards are gone, stop() returned their stats.
+        if self._futures is None:
+            raise RuntimeError("ShardedRunner not running")
+        shards = []
+        processed = 0
+        for index, inbox in enumerate(self._inboxes):
+            stats = self._stats.get(index, {})
+            processed += stats.get("processed", 0)
+            shards.append({
+                "routed": self._routed[index],
+                "processed": stats.get("processed", 0),
+                "machines": stats.get("machines", 0),
+                "depth": inbox.qsize(),
+                "buffered": len(self._buffers[index]),
+            })
+        return {"shards": shards,
+                "throughput": processed / (perf_counter() - self._begin)}
+
+    def stop(self):
+        # Graceful stop: pending events are processed then machines'
+        # fetch raises StopMachine. Returns final shards' stats.
+        self.flush()
+        for inbox in self._inboxes:
+            inbox.put(STOP)
+        results = []
+        try:
+            for index, future in enumerate(self._futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # Other shards' results are still returned
+                    results.append({"shard": index, "errors": [repr(e)]})
+        finally:
+            self._executor.shutdown()
+            self._manager.shutdown()
+            self._futures = None
+        return results
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        if self._futures is not None:
+            self.stop()
+
+
+class _Inbox:
+    # Machine fetch and notify. Events machines notify themselves are
+    # fetched before routed ones. Once stopped keeps raising
+    # StopMachine, so upper machines stop too.
+    def __init__(self):
+        self.queue = Queue()
+        self.notified = deque()
+        self.processed = 0
+        self.stopped = False
+
+    def put(self, event):
+        self.queue.put(event)
+
+    def notify(self, event):
+        self.notified.append(event)
+
+    def fetch(self):
+        if self.notified:
+            return self.notified.popleft()
+        if self.stopped:
+            raise StopMachine(None)
+        event = self.queue.get()
+        if event is STOP:
+            self.stopped = True
+            raise StopMachine(None)
+        self.processed += 1
+        return event
+
+
+class _AsyncInbox(_Inbox):
+    # AsyncMachine inbox, put from the shard thread, fetch within
+    # the event loop
+    def __init__(self, loop):
+        from asyncio import Queue
+        self.loop = loop
+        self.queue = Queue()
+        self.notified = deque()
+        self.processed = 0
+        self.stopped = False
+
+    def put(self, event):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    async def fetch(self):
+        if self.notified:
+            return self.notified.popleft()
+        if self.stopped:
+            raise StopMachine(None)
+        event = await self.queue.get()
+        if event is STOP:
+            self.stopped = True
+            raise StopMachine(None)
+        self.processed += 1
+        return event
+
+
+def _attach(machine, inbox):
+    # Every nested machine fetches from inbox, events they notify
+    # themselves go there too. Notifiers of plain Machine.notify stay.
+    for prefix, nested in machine._machines_():
+        nested.fetch = inbox.fetch
+        if getattr(nested, "fetch_many", None) is not None:
+            nested.fetch_many = None
+        if type(nested).notify is not Machine.notify:
+            nested.notify = inbox.notify
+
+
+def _run(key, machine, errors):
+    try:
+        machine.start()
+    except BaseException as e:
+        errors.append("%r: %r" % (key, e))
+
+
+async def _run_async(key, machine, errors):
+    try:
+        await machine.start()
+    except BaseException as e:
+        errors.append("%r: %r" % (key, e))
+
+
+def _shard(index, factory, inbox, stats, interval):
+    inboxes = {}
+    threads = []
+    tasks = []
+    errors = []
+    loop = None
+
+    def publish():
+        running = [i for i in inboxes.values() if i is not None]
+        stats[index] = {
+            "processed": sum(i.processed for i in running),
+            "machines": len(running),
+        }
+
+    published = perf_counter()
+    while True:
+        try:
+            batch = inbox.get(timeout=interval)
+        except Empty:
+            batch = ()
+        if batch is STOP:
+            break
+        for key, event in batch:
+            try:
+                machine_inbox = inboxes[key]
+            except KeyError:
+                try:
+                    machine = factory(key)
+                except Exception as e:
+                    # Key events are dropped, other keys go on
+                    errors.append("%r: %r" % (key, e))
+                    machine_inbox = inboxes[key] = None
+                else:
+                    if isinstance(machine, AsyncMachine):
+                        if loop is None:
+                            from asyncio import new_event_loop
+                            loop = new_event_loop()
+                            Thread(target=loop.run_forever, daemon=True).start()
+                        machine_inbox = inboxes[key] = _AsyncInbox(loop)
+                        _attach(machine, machine_inbox)
+                        tasks.append(run_coroutine_threadsafe(_run_async(key, machine, errors), loop))
+                    else:
+                        machine_inbox = inboxes[key] = _Inbox()
+                        _attach(machine, machine_inbox)
+                        thread = Thread(target=_run, args=(key, machine, errors), daemon=True)
+                        thread.start()
+                        threads.append(thread)
+            if machine_inbox is not None:
+                machine_inbox.put(event)
+        if perf_counter() - published >= interval:
+            publish()
+            published = perf_counter()
+    for machine_inbox in inboxes.values():
+        if machine_inbox is not None:
+            machine_inbox.put(STOP)
+    for thread in threads:
+        thread.join()
+    for task in tasks:
+        task.result()
+    if loop is not None:
+        loop.call_soon_threadsafe(loop.stop)
+    publish()
+    return dict(stats[index], shard=index, errors=errors)
+
+
+# Demo machines, module level so that spawned workers find device
+
+class Next(Event):
+    pass
+
+
+class Counter(State):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self.transitions = {Next: self.next}
+
+    def _enter_(self, event, from_state):
+        pass
+
+    def next(self, event):
+        self.count += 1
+
+
+class Device(Machine):
+    def __init__(self):
+        super().__init__([Counter()])
+        self.transitions = {Start: Counter}
+
+
+def device(key):
+    return Device()
+
+
+if __name__ == "__main__":
+    with ShardedRunner(device, shards=2, batch=256) as runner:
+        for i in range(100000):
+            runner.put("device-%d" % (i % 100), Next())
+        runner.flush()
+        print(runner.metrics())
+    print("stopped")
@@ -0,0 +1,175 @@
+from heapq import heappush, heappop
+from itertools import count
+from queue import Queue, Empty
+from threading import Lock
+from time import monotonic
+
+from state_machine import Event
+
+
+class Timeout(Event):
+    __slots__ = ("state",)
+
+    def __init__(self, state=None):
+        self.state = state
+
+
+class Scheduler:
+    """
+    Timed events on a single heap merged with external events.
+
+       queue  - external events source, get(timeout=...) raising
+                queue.Empty, default new queue.Queue.
+       clock  - seconds, default time.monotonic.
+
+    Machines' fetch returns scheduler.fetch(self._state). States
+    declaring timeout seconds get timeout_event(state), default
+    Timeout, if no event arrives within timeout since last fetch.
+    schedule(delay, event) adds one shot timers, cancel(handle)
+    removes them. No thread per timer.
+    """
+    def __init__(self, queue=None, clock=monotonic):
+        self.queue = Queue() if queue is None else queue
+        self.clock = clock
+        self._heap = []
+        self._count = count()
+        self._lock = Lock()
+
+    def notify(self, event):
+        self.queue.put(event)
+
+    def schedule(self, delay, event):
+        handle = [self.clock() + delay, next(self._count), event]
+        with self._lock:
+            first = not self._heap or handle[0] < self._heap[0][0]
+            heappush(self._heap, handle)
+        if first:
+            # Wake up waiting fetch. None events are never returned.
+            self._wake()
+        return handle
+
+    def cancel(self, handle):
+        # Lazy removal when popped
+        handle[2] = None
+
+    def _wake(self):
+        self.queue.put(None)
+
+    def _due(self, state, now, deadline):
+        # Due event or seconds to wait, None forever
+        heap = self._heap
+        with self._lock:
+            while heap and heap[0][2] is None:
+                heappop(heap)
+            if heap and heap[0][0] <= now:
+                return heappop(heap)[2], 0
+            if heap and (deadline is None or heap[0][0] < deadline):
+                wait = heap[0][0] - now
+            elif deadline is None:
+                return None, None
+            elif deadline <= now:
+                return getattr(state, "timeout_event", Timeout)(state), 0
+            else:
+                wait = deadline - now
+        return None, wait
+
+    def fetch(self, state=None):
+        now = self.clock()
+        timeout = getattr(state, "timeout", None)
+        deadline = None if timeout is None else now + timeout
+        while True:
+            event, wait = self._due(state, now, deadline)
+            if event is not None:
+                return event
+            try:
+                event = self.queue.get(timeout=wait)
+            except Empty:
+                pass
+            else:
+                if event is not None:
+                    return event
+            now = self.clock()
+
+
+class AsyncScheduler(Scheduler):
+    # Scheduler over asyncio.Queue for AsyncMachine
+    def __init__(self, queue=None, clock=monotonic):
+        from asyncio import Queue
+        super().__init__(Queue() if queue is None else queue, clock)
+
+    def notify(self, event):
+        self.queue.put_nowait(event)
+
+    def _wake(self):
+        self.queue.put_nowait(None)
+
+    async def fetch(self, state=None):
+        from asyncio import wait_for, TimeoutError
+        now = self.clock()
+        timeout = getattr(state, "timeout", None)
+        deadline = None if timeout is None else now + timeout
+        while True:
+            event, wait = self._due(state, now, deadline)
+            if event is not None:
+                return event
+            try:
+                if wait is None:
+                    event = await self.queue.get()
+                else:
+                    event = await wait_for(self.queue.get(), wait)
+            except TimeoutError:
+                pass
+            else:
+                if event is not None:
+                    return event
+            now = self.clock()
+
+
+if __name__ == "__main__":
+    from threading import Thread
+    from time import sleep
+    from state_machine import State, Machine, Start
+
+    class Data(Event):
+        pass
+
+    class Tick(Event):
+        pass
+
+    scheduler = Scheduler()
+
+    class Waiting(State):
+        timeout = 0.2
+
+        def __init__(self):
+            super().__init__()
+            self.transitions = {Data: self.data, Tick: self.tick, Timeout: Receiver}
+
+        def _enter_(self, event, from_state):
+            print("waiting data, 0.2s timeout")
+            scheduler.schedule(0.1, Tick())
+
+        def data(self, event):
+            print("data")
+
+        def tick(self, event):
+            print("tick")
+
+    class Receiver(Machine):
+        def __init__(self):
+            super().__init__([Waiting()])
+            self.transitions = {Start: Waiting}
+
+        def fetch(self):
+            return scheduler.fetch(self._state)
+
+        def _exit_(self, event, to_state, exc):
+            print("timeout, exit")
+
+    def producer():
+        for i in range(3):
+            sleep(0.15)
+            scheduler.notify(Data())
+
+    Thread(target=producer).start()
+    Receiver().start()
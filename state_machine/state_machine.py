@@ -1,76 +1,166 @@
-from inspect import isclass
+from inspect import isclass, isawaitable, iscoroutinefunction
 from traceback import format_exception
+from collections import deque, namedtuple
 from collections.abc import Iterable
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from time import perf_counter
 
 def node_format(item):
     if hasattr(item, "__name__"):
         return item.__name__
+    elif isinstance(item, tuple):
+        return "(" + ", ".join(map(node_format, item)) + ")"
     else:
         return type(item).__name__
 
 def graph_format(item):
     if isinstance(item, dict):
-        if not item:
-            return "{}"
-        string = "{"
-        for key, value in item.items():
-            string += key.__name__ + ": "
-            if isinstance(value, dict):
-                if not value:
-                    string += "{}"
-                else:
-                    string += "{"
-                    for k, v in value:
-                        string += k.__name__ + ": " + node_format(v) + ", "
-                    string = string[:-2] + "}, "
-            else:
-                string += node_format(value) + ", "
-        string = string[:-2] + "}"
+        return "{" + ", ".join(
+            node_format(key) + ": "
+            + ("{" + ", ".join(node_format(k) + ": " + node_format(v)
+                               for k, v in value.items()) + "}"
+               if isinstance(value, dict) else node_format(value))
+            for key, value in item.items()) + "}"
     elif isinstance(item, Iterable):
-        if not item:
-            return "[]"
-        string = "["
-        for i in item:
-            string += node_format(i) + ", "
-        string = string[:-2] + "]"
+        return "[" + ", ".join(map(node_format, item)) + "]"
     else:
-        string = node_format(item)
-    return string
+        return node_format(item)
+
+
+class Graph:
+    # Formats item when printed, once
+    __slots__ = ("item", "_string")
+
+    def __init__(self, item):
+        self.item = item
+        self._string = None
+
+    def __str__(self):
+        if self._string is None:
+            self._string = graph_format(self.item)
+        return self._string
+
+
+class Message:
+    # Exception message joining its parts when printed. Exceptions
+    # carry graphs without formatting them.
+    __slots__ = ("parts", "_string")
+
+    def __init__(self, *parts):
+        self.parts = parts
+        self._string = None
+
+    def __str__(self):
+        if self._string is None:
+            self._string = "".join(map(str, self.parts))
+        return self._string
+
+    def __repr__(self):
+        # KeyError shows repr of its argument
+        return repr(str(self))
 
 
 class Event:
-    pass
+    # Subclasses declaring __slots__ have no __dict__
+    __slots__ = ()
+    # Inbox replaces last queued event of the same type with this one
+    coalesce = False
 
 
 class Exit(Event):
+    __slots__ = ("event",)
+
     def __init__(self, event=None):
         self.event = event
 
 
 class Start(Event):
+    __slots__ = ("event",)
+
     def __init__(self, event=None):
         self.event = event
 
 
 class Args(Event):
+    __slots__ = ("args", "kwargs")
+
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
 
 
+# Shared wrappers without event. Don't modify them.
+START = Start()
+EXIT = Exit()
+
+
+class PooledEvent(Event):
+    # Opt-in free list per subclass, up to size events. Create events
+    # with acquire(...). Machines release them once a state function
+    # handled them, then don't keep references. Events entering states
+    # are not released, states may keep them. Tracers keep references
+    # too, don't trace machines handling pooled events.
+    __slots__ = ()
+    size = 1024
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._free = []
+
+    @classmethod
+    def acquire(cls, *args, **kwargs):
+        if cls._free:
+            event = cls._free.pop()
+            event.__init__(*args, **kwargs)
+            return event
+        return cls(*args, **kwargs)
+
+    def release(self):
+        if len(self._free) < self.size:
+            self._free.append(self)
+
+
 class Subject:
     def __init__(self):
         self._observers = []
+        self._bound = {}
 
     def register(self, observer):
         self._observers.append(observer)
+        self._bound = {}
 
     def notify_all(self, event):
-        for observer in self._observers:
-            observer.notify(event)
+        try:
+            notifiers = self._bound[type(event)]
+        except KeyError:
+            notifiers = self._bind_(type(event))
+        for notifier in notifiers:
+            notifier(event)
+
+    def _bind_(self, event_type):
+        # Observers' notifier callables for event type. Observers with
+        # bind(event type) resolve them once, others get notify.
+        notifiers = self._bound[event_type] = tuple(
+            observer.bind(event_type) if hasattr(observer, "bind") else observer.notify
+            for observer in self._observers)
+        return notifiers
 
 
 class State(Subject):
+    @property
+    def transitions(self):
+        return self._transitions
+
+    @transitions.setter
+    def transitions(self, transitions):
+        # Machines this state is in rebuild their tables before their
+        # next event. Mutating transitions in place needs compile().
+        self._transitions = transitions
+        for observer in getattr(self, "_observers", ()):
+            if isinstance(observer, Machine):
+                observer._dispatch = None
+                observer._graphs = {}
+
     def _enter_(self, event, from_state):
         raise NotImplementedError()
 
@@ -78,16 +168,385 @@ class State(Subject):
         pass
 
 
+class QueueBatcher:
+    # Batched source over queue.Queue. Machines' notify and fetch_many
+    # delegate here. fetch_many blocks for first event then drains up
+    # to size events. Returned deque is shared by every machine using
+    # this source, so nested machines keep events order.
+    def __init__(self, queue=None, size=None):
+        if queue is None:
+            from queue import Queue
+            queue = Queue()
+        self.queue = queue
+        self.size = size
+        self.pending = deque()
+
+    def notify(self, event):
+        self.queue.put(event)
+
+    def fetch(self):
+        if self.pending:
+            return self.pending.popleft()
+        return self.queue.get()
+
+    def fetch_many(self):
+        pending = self.pending
+        if not pending:
+            queue = self.queue
+            pending.append(queue.get())
+            # Drain the backlog holding the queue lock once
+            size = self.size
+            with queue.mutex:
+                while queue._qsize() and (size is None or len(pending) < size):
+                    pending.append(queue._get())
+                queue.not_full.notify_all()
+        return pending
+
+
+class DequeBatcher:
+    # Batched source over collections.deque. fetch_many returns the
+    # deque itself, empty deque makes machines poll like None events.
+    def __init__(self, queue=None):
+        self.queue = deque() if queue is None else queue
+
+    def notify(self, event):
+        self.queue.append(event)
+
+    def fetch(self):
+        if self.queue:
+            return self.queue.popleft()
+
+    def fetch_many(self):
+        return self.queue
+
+
+class Inbox:
+    """
+    Bounded, thread safe events source for machines, notify and
+    fetch or fetch_many delegate here.
+
+       capacity  - events queued at most, None unbounded.
+       policy    - when full, "block" the producer, "drop_oldest"
+                   queued event or "reject" raising queue.Full.
+       timeout   - seconds block waits before raising queue.Full.
+       size      - events per fetch_many batch at most.
+
+    Events whose type has coalesce true replace the last queued event
+    if it has their same type. stats() gives depth, high water mark,
+    dropped, rejected and coalesced counters.
+    """
+    def __init__(self, capacity=None, policy="block", timeout=None, size=None):
+        from threading import Condition
+        if policy not in ("block", "drop_oldest", "reject"):
+            raise ValueError("Inbox policy: " + str(policy))
+        if capacity is not None and capacity < 1:
+            raise ValueError("Inbox capacity: " + str(capacity))
+        self.capacity = capacity
+        self.policy = policy
+        self.timeout = timeout
+        self.size = size
+        self.queue = deque()
+        self.pending = deque()
+        self.high = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self._changed = Condition()
+
+    def notify(self, event):
+        from queue import Full
+        queue = self.queue
+        pending = self.pending
+        with self._changed:
+            if getattr(event, "coalesce", False):
+                # Last queued event, pending if the queue is empty.
+                # Machines pop pending without the lock.
+                last = queue if queue else pending
+                try:
+                    if type(last[-1]) is type(event):
+                        last[-1] = event
+                        self.coalesced += 1
+                        return
+                except IndexError:
+                    pass
+            # Depth counts the batch machines are popping
+            if self.capacity is not None and len(queue) + len(pending) >= self.capacity:
+                if self.policy == "drop_oldest":
+                    try:
+                        (pending if pending else queue).popleft()
+                        self.dropped += 1
+                    except IndexError:
+                        # Popped meanwhile, there is room
+                        pass
+                elif self.policy == "reject":
+                    self.rejected += 1
+                    raise Full()
+                elif not self._changed.wait_for(lambda: len(queue) + len(pending) < self.capacity,
+                                                self.timeout):
+                    self.rejected += 1
+                    raise Full()
+            queue.append(event)
+            depth = len(queue) + len(pending)
+            if depth > self.high:
+                self.high = depth
+            self._changed.notify_all()
+
+    def fetch(self):
+        with self._changed:
+            if self.pending:
+                event = self.pending.popleft()
+            else:
+                queue = self.queue
+                self._changed.wait_for(lambda: queue)
+                event = queue.popleft()
+            self._changed.notify_all()
+        return event
+
+    def fetch_many(self):
+        pending = self.pending
+        if not pending:
+            queue = self.queue
+            size = self.size
+            with self._changed:
+                # Drained batch makes room for blocked producers
+                self._changed.notify_all()
+                self._changed.wait_for(lambda: queue)
+                if size is None or len(queue) <= size:
+                    # Whole backlog, queue becomes pending
+                    pending.extend(queue)
+                    queue.clear()
+                else:
+                    for i in range(size):
+                        pending.append(queue.popleft())
+        return pending
+
+    def stats(self):
+        return {"depth": len(self.queue) + len(self.pending), "high": self.high,
+                "dropped": self.dropped, "rejected": self.rejected,
+                "coalesced": self.coalesced}
+
+
+class AsyncQueueBatcher:
+    # Batched source over asyncio.Queue for AsyncMachine.
+    def __init__(self, queue=None, size=None):
+        from asyncio import Queue, QueueEmpty
+        self.queue = Queue() if queue is None else queue
+        self.size = size
+        self.pending = deque()
+        self._empty = QueueEmpty
+
+    def notify(self, event):
+        self.queue.put_nowait(event)
+
+    async def fetch(self):
+        if self.pending:
+            return self.pending.popleft()
+        return await self.queue.get()
+
+    async def fetch_many(self):
+        pending = self.pending
+        if not pending:
+            pending.append(await self.queue.get())
+            get = self.queue.get_nowait
+            size = self.size
+            try:
+                while size is None or len(pending) < size:
+                    pending.append(get())
+            except self._empty:
+                pass
+        return pending
+
+
+class AsyncState(State):
+    # States of asyncio machines. _enter_, _exit_ and observers'
+    # notify can be coroutines.
+    async def notify_all(self, event):
+        try:
+            notifiers = self._bound[type(event)]
+        except KeyError:
+            notifiers = self._bind_(type(event))
+        for notifier in notifiers:
+            result = notifier(event)
+            if result is not None and isawaitable(result):
+                await result
+
+
 class StopMachine(Exception):
     def __init__(self, event):
         self.event = event
 
 
+# Tracing. Machines call tracer.trace(record) when their tracer
+# is not None: "start" machine, "enter" and "exit" state,
+# "transition" between states and "stop" machine.
+TraceRecord = namedtuple("TraceRecord", "kind machine state event target exc time")
+
+
+def _slotted(event_type, name):
+    # name is an instance slot of event type
+    for cls in event_type.__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        if name in ((slots,) if isinstance(slots, str) else slots):
+            return True
+    return False
+
+
+def _attribute(event, name):
+    # Event instance attribute, __dict__ or __slots__, else name itself.
+    # Class attributes and methods are not event values.
+    if _slotted(type(event), name):
+        return getattr(event, name, name)
+    return getattr(event, "__dict__", {}).get(name, name)
+
+
+class _Notifiers(dict):
+    # Machine notifiers. Changing them clears states' bound notifiers.
+    def __init__(self, machine, notifiers):
+        super().__init__(notifiers)
+        self._machine = machine
+
+    def _changed_(self):
+        for state in self._machine._states.values():
+            state._bound = {}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed_()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed_()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed_()
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._changed_()
+        return value
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._changed_()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed_()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._changed_()
+
+
+class Tracer:
+    def trace(self, record):
+        pass
+
+
+class PrintTracer(Tracer):
+    def __init__(self, file=None):
+        self.file = file
+
+    def trace(self, record):
+        if record.kind == "start":
+            machine, direction = "  Machine Starting:", "  Entering from:"
+        elif record.kind == "enter":
+            machine, direction = "  Machine:", "  Entering from:"
+        elif record.kind == "stop":
+            machine, direction = "  Machine Exiting:", "  Exiting to:"
+        elif record.kind == "exit":
+            machine, direction = "  Machine:", "  Exiting to:"
+        else:
+            machine, direction = "  Machine:", "  Transition to:"
+        print(graph_format(record.machine._observers),
+              machine, type(record.machine).__name__,
+              "  State:", type(record.state).__name__,
+              "  Event:", type(record.event if record.exc is None else record.exc).__name__,
+              direction, type(record.target).__name__,
+              file=self.file)
+
+
+class RingTracer(Tracer):
+    # Always on capture of last size records
+    def __init__(self, size=1024):
+        self.records = deque(maxlen=size)
+        self.trace = self.records.append
+
+
+class TimingTracer(Tracer):
+    # Per state histogram of time between enter and exit. Bucket
+    # i counts stays shorter than 2**i microseconds.
+    def __init__(self):
+        self.histograms = {}
+        self._entered = {}
+
+    def trace(self, record):
+        if record.kind == "enter":
+            self._entered[record.state] = record.time
+        elif record.kind == "exit":
+            try:
+                elapsed = record.time - self._entered.pop(record.state)
+            except KeyError:
+                return
+            bucket = int(elapsed * 1e6).bit_length()
+            try:
+                histogram = self.histograms[type(record.state)]
+            except KeyError:
+                histogram = self.histograms[type(record.state)] = []
+            if len(histogram) <= bucket:
+                histogram.extend([0] * (bucket + 1 - len(histogram)))
+            histogram[bucket] += 1
+
+    def histogram(self, state_type):
+        # {upper bound in microseconds: stays}
+        return {2 ** i: count for i, count
+                in enumerate(self.histograms.get(state_type, ())) if count}
+
+
+class TeeTracer(Tracer):
+    def __init__(self, *tracers):
+        self.tracers = tracers
+
+    def trace(self, record):
+        for tracer in self.tracers:
+            tracer.trace(record)
+
+
+# Dispatch record kinds
+CALL, ENTER, STOP, FAIL = range(4)
+
+
+def _released(function):
+    # State function releasing the pooled event it handled
+    if iscoroutinefunction(function):
+        async def call(event):
+            await function(event)
+            event.release()
+    else:
+        def call(event):
+            function(event)
+            event.release()
+    return call
+
+
 class Machine(State):  # Prepared to be State
+    tracer = None
+    # Flat machines drive sub-machines' loops from their own driver
+    # loop, a stack of machines instead of nested calls.
+    flat = False
+
     def __init__(self, states=None, transitions=None, notifiers=None):
         super().__init__()
         self._type = type(self)
         self._state = None
+        self._first = None
+        self._dispatch = None
+        self._graphs = {}
+        self._running = False
+        self._resuming = False
         self._states = {}
         for state in states or self.states:
             self._states[type(state)] = state
@@ -102,146 +561,307 @@ class Machine(State):  # Prepared to be State
         if notifiers:
             self.notifiers = notifiers
 
+    @property
+    def transitions(self):
+        return self._transitions
+
+    @transitions.setter
+    def transitions(self, transitions):
+        # Dispatch tables and graphs are rebuilt before next event,
+        # upper machine's too
+        State.transitions.fset(self, transitions)
+        self._dispatch = None
+        self._graphs = {}
+
+    def graph(self, state=None):
+        # Machine's or its state's transitions formatted lazily.
+        # Cached until transitions change or compile.
+        try:
+            return self._graphs[state]
+        except KeyError:
+            graph = self._graphs[state] = Graph(
+                self.transitions if state is None else getattr(state, "transitions", {}))
+            return graph
+
+    def compile(self):
+        # Validate the whole graph once and build a flat dispatch
+        # table per state: {event type: (kind, target, hook)}.
+        # Call again after mutating states' transitions.
+        transitions = self.transitions
+        self._graphs = {}
+        # Machines' transitions have to have Start event
+        try:
+            function_or_type = transitions[Start]
+        except KeyError as e:
+            e.args = (Message(e.args[0], "   Missing: Start",
+                              " in: ", type(self).__name__,
+                              " transitions: ", self.graph()),)
+            raise
+        if function_or_type is self._type:
+            # Machines cannot point to themselves
+            raise ValueError("Machine Start: Machine. Infinite loop")
+        elif not isclass(function_or_type):
+            raise TypeError("Not state: " + str(function_or_type))
+        first = self._lookup_(function_or_type)
+        # Upper events are handled by this machine, not by its states
+        upper = [event_type for event_type in transitions
+                 if not isinstance(event_type, tuple)]
+        dispatch = {}
+        for state_type, state in self._states.items():
+            state_transitions = getattr(state, "transitions", {})
+            table = {}
+            for event_type, function_or_type in state_transitions.items():
+                if isinstance(event_type, tuple) or event_type in transitions:
+                    continue
+                # Transitions values states and callable objects allowed
+                if function_or_type is self._type:
+                    # Transition to itself involve Exit
+                    table[event_type] = (STOP, None, None)
+                elif isclass(function_or_type):
+                    # Next state and (from, to) transition function if exists
+                    table[event_type] = (ENTER, self._lookup_(function_or_type),
+                                         state_transitions.get((state_type, function_or_type)))
+                elif callable(function_or_type):
+                    # We still don't leave current state. Pooled
+                    # events are released once handled.
+                    if issubclass(event_type, PooledEvent):
+                        function_or_type = _released(function_or_type)
+                    table[event_type] = (CALL, function_or_type, None)
+                else:
+                    # Fails only if the event arrives: sub-machines'
+                    # own upper events are here.
+                    table[event_type] = (FAIL, Message("Neither function nor state: ",
+                                                       function_or_type), TypeError)
+            for event_type in upper:
+                # If upper event in state transitions then call
+                # its function value before exit
+                function = state_transitions.get(event_type)
+                if isclass(function):
+                    # This value cannot be a state because the event
+                    # has to be handled by upper machine. Fails only
+                    # if the event arrives: sub-machines' Start is here.
+                    table[event_type] = (FAIL, Message("Upper event: ", event_type.__name__,
+                                                       " value: ", function.__name__,
+                                                       " in:", self.graph(state),
+                                                       " hasn't to be class"), ValueError)
+                else:
+                    table[event_type] = (STOP, None, function)
+            dispatch[state] = table
+        self._first = first
+        self._dispatch = dispatch
+        # Sub-machines the flat driver runs in place of their _enter_
+        self._nested = {state for state in self._states.values()
+                        if isinstance(state, Machine) and type(state)._enter_ is Machine._enter_}
+        return self
+
+    def _reload_(self):
+        # Tables and current state table after transitions changed,
+        # compiled again if invalidated
+        if self._dispatch is None:
+            self.compile()
+        return self._dispatch, self._dispatch[self._state]
+
+    def _lookup_(self, state_type):
+        try:
+            return self._states[state_type]
+        except KeyError as e:
+            e.args = (Message(e.args[0], "   Missing: ", state_type.__name__,
+                              " in: ", type(self).__name__,
+                              " states: ", Graph(self._states.keys())),)
+            raise
+
     def _enter_(self, event, from_state):
+        self._running = True
+        try:
+            self._drive_(self._run_(event, from_state, False))
+        finally:
+            self._running = False
+
+    def _resume_(self):
+        self._resuming = False
+        self._running = True
+        try:
+            self._drive_(self._run_(None, None, True))
+        finally:
+            self._running = False
+
+    @staticmethod
+    def _drive_(run):
+        # Run machine loop. Flat machines' loops yield (sub-machine,
+        # event, from state) instead of entering it, its loop goes on
+        # top of the stack. Finished loops resume the one below, their
+        # exceptions raise inside it as from sub-machine _enter_.
+        stack = [(None, run)]
+        error = None
+        while stack:
+            machine, run = stack[-1]
+            try:
+                if error is None:
+                    nested = next(run)
+                else:
+                    nested, error = run.throw(error), None
+            except StopIteration:
+                stack.pop()
+            except BaseException as e:
+                stack.pop()
+                if not stack:
+                    raise
+                error = e
+            else:
+                machine = nested[0]
+                machine._running = True
+                stack.append((machine, machine._run_(nested[1], nested[2], False)))
+                continue
+            if machine is not None:
+                machine._running = False
+
+    def _run_(self, event, from_state, resume):
         # [ <first>
         # Simulates Start event. Enter into first machine state.
         # Machines cannot handle their own state, then have to
         # enter immediately in their first state.
+        tracer = self.tracer
         try:
-            # Machines' transitions have to have Start event
-            try:
-                function_or_type = self.transitions[Start]
-            except KeyError as e:
-                e.args = (str(e.args[0]) + "   Missing: Start"
-                          + " in: " + type(self._state).__name__
-                          + " transitions: " + graph_format(self._state.transitions),)
-                raise
-            if function_or_type is self._type:
-                # Machines cannot point to themselves
-                raise ValueError("Machine Start: Machine. Infinite loop")
-            elif isclass(function_or_type):
-                state_type = function_or_type
+            if self._dispatch is None:
+                self.compile()
+            dispatch = self._dispatch
+            if resume:
+                # Restored state was already entered. Only running
+                # sub-machines resume their loops.
+                if isinstance(self._state, Machine) and self._state._resuming:
+                    self._state._resume_()
             else:
-                raise TypeError("Not state: " + str(function_or_type))
-            # Obtain fisrt state instance
-            try:
-                state = self._states[state_type]
-            except KeyError as e:
-                e.args = (str(e.args[0]) + "   Missing: " + state_type.__name__
-                          + " in: " + type(self).__name__
-                          + " states: " + graph_format(self._states.keys()),)
-                raise
-            # Enter into first state instance
-            self._state = state
-            # <PRINT enter start self>
-            self._state._enter_(Start(event), self)
+                # Enter into first state instance
+                self._state = self._first
+                event = START if event is None else Start(event)
+                if tracer is not None:
+                    tracer.trace(TraceRecord("enter", self, self._state, event, self, None, perf_counter()))
+                if self.flat and self._state in self._nested:
+                    yield self._state, event, self
+                else:
+                    self._state._enter_(event, self)
         except StopMachine as e:
             if self._observers:
+                if tracer is not None:
+                    tracer.trace(TraceRecord("stop", self, self._state, e.event, None, None, perf_counter()))
                 # Machines' transitions then has to contain Exit transition
-                self.notify_all(Exit(e.event))
+                self.notify_all(EXIT if e.event is None else Exit(e.event))
             else:
-                # <PRINT exit start stop self>
+                if tracer is not None:
+                    tracer.trace(TraceRecord("stop", self, self._state, e.event, None, None, perf_counter()))
                 self._exit_(e.event, None, None)
             return
         except BaseException as e:
             if self._observers:
                 raise
             else:
-                # <PRINT exit start exception self>
+                if tracer is not None:
+                    tracer.trace(TraceRecord("stop", self, self._state, None, None, e, perf_counter()))
                 if self._exit_(None, None, e) is None:
                     raise
         # ] <first>
         # [ <loop>
         # Machines' main event loop. Fetch and process events.
-        # Contains machines' logic.
+        # Contains machines' logic. One table lookup per event.
+        table = dispatch[self._state]
+        kind = hook = None
+        many = getattr(self, "fetch_many", None)
+        pending = None
+        nested = self._nested if self.flat else ()
         while True:
             try:
                 try:
                     # Get next event
-                    event = self.fetch()
+                    if many is None:
+                        event = self.fetch()
+                    elif pending:
+                        event = pending.popleft()
+                    else:
+                        # Next batch. Sources return their own deque,
+                        # shared with upper and sub-machines, which
+                        # then keep on popping events in order.
+                        pending = many()
+                        if not isinstance(pending, deque):
+                            raise TypeError("fetch_many: deque expected, not " + type(pending).__name__)
+                        continue
                     if event is None:
                         continue
-                    event_type = type(event)
-                    # If event in Machine's transitions cannot handle it.
-                    # Exit controlled calling to current state function
-                    # if exists
-                    if event_type in self.transitions:
-                        # If upper event in state transitions then call
-                        # its function value
-                        if event_type in self._state.transitions:
-                            function = self._state.transitions[event_type]
-                            # This value cannot be a state because the event
-                            # has to be hancdled by upper machine.
-                            # Then state value has to be in current machine
-                            # transitions and not in current state transitions
-                            if isclass(function):
-                                raise ValueError("Upper event: " + event_type.__name__
-                                                 + " value: " + function.__name__
-                                                 + " in:" + graph_format(self._state.transitions)
-                                                 + " hasn't to be class")
-                            function(event)
-                        # Exit controlled
-                        raise StopMachine(event)
                     try:
-                        function_or_type = self._state.transitions[event_type]
+                        kind, target, hook = table[type(event)]
                     except KeyError as e:
-                        e.args = (str(e.args[0]) + "   Missing: " + event_type.__name__
-                                  + " in: " + type(self._state).__name__
-                                  + " transitions: " + graph_format(self._state.transitions),)
-                        raise
-                    # Transitions values states and callable objects allowed
-                    if function_or_type is self._type:
-                        # Transition to itself involve Exit
-                        raise StopMachine(event)
-                    elif isclass(function_or_type):
-                        # Next state type
-                        state_type = function_or_type
-                    elif callable(function_or_type):
-                        # We still don't leave current state
-                        function_or_type(event)
+                        if self._dispatch is not dispatch:
+                            # Transitions changed, tables rebuilt
+                            dispatch, table = self._reload_()
+                        if type(event) not in table:
+                            e.args = (Message(e.args[0], "   Missing: ", type(event).__name__,
+                                              " in: ", type(self._state).__name__,
+                                              " transitions: ", self.graph(self._state)),)
+                            raise
+                        kind, target, hook = table[type(event)]
+                    if kind == ENTER:
+                        # Next state
+                        state = target
+                    elif kind == CALL:
+                        # We still don't leave current state. Its
+                        # function may change transitions.
+                        target(event)
+                        if self._dispatch is not dispatch:
+                            dispatch, table = self._reload_()
                         continue
+                    elif kind == STOP:
+                        # Upper event or transition to itself.
+                        # Exit controlled
+                        if hook is not None:
+                            hook(event)
+                        raise StopMachine(event)
                     else:
-                        raise TypeError("Neither function nor state: " + str(function_or_type))
-                    # Next state
-                    try:
-                        state = self._states[state_type]
-                    except KeyError as e:
-                        e.args = (str(e.args[0]) + "   Missing: " + state_type.__name__
-                                  + " in: " + type(self).__name__
-                                  + " states: " + graph_format(self._states.keys()),)
-                        raise
+                        raise hook(target)
                 except StopMachine as e:
                     # Controlled state exit then machine stop
-                    # <PRINT exit stop state>
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("exit", self, self._state, e.event, self, None, perf_counter()))
                     self._state._exit_(e.event, self, None)
                     raise
                 except BaseException as e:
                     # Controlled state exit
-                    # <PRINT exit exception state>
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("exit", self, self._state, None, self, e, perf_counter()))
                     if self._state._exit_(None, self, e) is None:
                         raise
                 else:
                     # Next state then exit current state
-                    # <PRINT exit state>
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("exit", self, self._state, event, state, None, perf_counter()))
                     self._state._exit_(event, state, None)
                 # Begin transition
                 from_state = self._state
+                if tracer is not None:
+                    tracer.trace(TraceRecord("transition", self, from_state, event, state, None, perf_counter()))
                 self._state = None
-                transition = (type(from_state), state_type)
-                if transition in from_state.transitions:
-                    from_state.transitions[transition](event, from_state, state)
+                if hook is not None:
+                    hook(event, from_state, state)
                 # End transition entering in next state
                 self._state = state
-                # <PRINT enter state>
-                self._state._enter_(event, from_state)
+                table = dispatch[state]
+                if tracer is not None:
+                    tracer.trace(TraceRecord("enter", self, self._state, event, from_state, None, perf_counter()))
+                if state in nested:
+                    yield state, event, from_state
+                else:
+                    state._enter_(event, from_state)
+                if self._dispatch is not dispatch:
+                    dispatch, table = self._reload_()
             except StopMachine as e:
                 # Whether upper machine then upper machine handle exit
                 # else current machine exits by itself
                 if self._observers:
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("stop", self, self._state, e.event, self, None, perf_counter()))
                     # Machines' transitions then has to contain Exit transition
-                    self.notify_all(Exit(e.event))
+                    self.notify_all(EXIT if e.event is None else Exit(e.event))
                 else:
-                    # <PRINT exit stop self>
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("stop", self, self._state, e.event, self, None, perf_counter()))
                     self._exit_(e.event, self, None)
                 return
             except BaseException as e:
@@ -250,42 +870,354 @@ class Machine(State):  # Prepared to be State
                 if self._observers:
                     raise
                 else:
-                    # <PRINT exit exception self>
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("stop", self, self._state, None, None, e, perf_counter()))
                     if self._exit_(None, None, e) is None:
                         raise
         # ] <loop>
 
     def start(self, event=None, from_state=None):
-        # <PRINT machine start>
+        if self.tracer is not None:
+            self.tracer.trace(TraceRecord("start", self, None, event, from_state, None, perf_counter()))
         self._enter_(event, from_state)
         return self
 
+    def resume(self):
+        # Continue restored machine loop without entering its states
+        if self._state is None:
+            return self.start()
+        if self.tracer is not None:
+            self.tracer.trace(TraceRecord("start", self, self._state, None, None, None, perf_counter()))
+        self._resume_()
+        return self
+
+    def _machines_(self, prefix=()):
+        # This and nested machines with their states path
+        yield prefix, self
+        for state_type, state in self._states.items():
+            if isinstance(state, Machine):
+                yield from state._machines_(prefix + (state_type.__qualname__,))
+
+    def snapshot(self):
+        # Current states path through running sub-machines and
+        # attributes set by tuple notifiers in every nested machine.
+        path = []
+        machine = self
+        while machine._state is not None:
+            path.append(type(machine._state).__qualname__)
+            if not (isinstance(machine._state, Machine) and machine._state._running):
+                break
+            machine = machine._state
+        attributes = {}
+        for prefix, machine in self._machines_():
+            values = {}
+            for notifier in getattr(machine, "notifiers", {}).values():
+                if isinstance(notifier, tuple) and notifier[0] in machine.__dict__:
+                    values[notifier[0]] = machine.__dict__[notifier[0]]
+            if values:
+                attributes[prefix] = values
+        return dumps((path, attributes), HIGHEST_PROTOCOL)
+
+    def restore(self, snapshot):
+        # Set states and attributes from snapshot. resume() continues.
+        path, attributes = loads(snapshot)
+        machine = self
+        for depth, name in enumerate(path):
+            for state_type, state in machine._states.items():
+                if state_type.__qualname__ == name:
+                    break
+            else:
+                raise KeyError(Message(name, "   Missing: ", name,
+                                       " in: ", type(machine).__name__,
+                                       " states: ", Graph(machine._states.keys())))
+            machine._state = state
+            if depth + 1 < len(path):
+                state._resuming = True
+                machine = state
+        for prefix, machine in self._machines_():
+            machine.__dict__.update(attributes.get(prefix, ()))
+        return self
+
     def notify(self, event):
         try:
             notifier = self.notifiers[type(event)]
         except KeyError as e:
-            e.args = (str(e.args[0]) + "   Missing: " + type(event).__name__
-                      + " in: " + type(self).__name__
-                      + " notifiers: " + graph_format(self.notifiers),)
+            e.args = (Message(e.args[0], "   Missing: ", type(event).__name__,
+                              " in: ", type(self).__name__,
+                              " notifiers: ", Graph(self.notifiers)),)
             raise
         if isinstance(notifier, tuple):
             key, value_or_ref = notifier
-            if value_or_ref in event.__dict__:
-                self.__dict__[key] = event.__dict__[value_or_ref]
-            elif value_or_ref == "":
+            if value_or_ref == "":
                 self.__dict__[key] = event
+            elif isinstance(value_or_ref, str):
+                # Event attribute or, if missing, the value itself
+                self.__dict__[key] = _attribute(event, value_or_ref)
             else:
                 self.__dict__[key] = value_or_ref
         else:
             return notifier(event)
 
+    def bind(self, event_type):
+        # notify resolved for event type. Subjects call it once per
+        # event type, then call the returned function per event.
+        if type(self).notify is not Machine.notify or "notify" in self.__dict__:
+            return self.notify
+        try:
+            notifier = self.notifiers[event_type]
+        except (AttributeError, KeyError):
+            # notify raises missing notifier
+            return self.notify
+        if not isinstance(notifier, tuple):
+            return notifier
+        key, value_or_ref = notifier
+        attributes = self.__dict__
+        if value_or_ref == "":
+            def notifier(event):
+                attributes[key] = event
+        elif _slotted(event_type, value_or_ref):
+            def notifier(event):
+                attributes[key] = getattr(event, value_or_ref, value_or_ref)
+        elif isinstance(value_or_ref, str):
+            def notifier(event):
+                attributes[key] = getattr(event, "__dict__", {}).get(value_or_ref, value_or_ref)
+        else:
+            def notifier(event):
+                attributes[key] = value_or_ref
+        return notifier
+
+    @property
+    def notifiers(self):
+        return self._notifiers
+
+    @notifiers.setter
+    def notifiers(self, notifiers):
+        # States bind notifiers again, and again whenever the
+        # notifiers change. Class level notifiers are read as they
+        # are, set them before the first event.
+        self._notifiers = _Notifiers(self, notifiers)
+        for state in self._states.values():
+            state._bound = {}
+
     def fetch(self):
         raise NotImplementedError()
 
 
+class AsyncMachine(Machine, AsyncState):
+    # Machine sharing an asyncio event loop. fetch, states' _enter_
+    # and _exit_, transition functions and notifiers can be coroutines
+    # or plain functions. Sub-machines, sync or async, are awaited
+    # in place, as Machine does calling them.
+    async def _enter_(self, event, from_state):
+        self._running = True
+        try:
+            await self._run_(event, from_state, False)
+        finally:
+            self._running = False
+
+    async def _resume_(self):
+        self._resuming = False
+        self._running = True
+        try:
+            await self._run_(None, None, True)
+        finally:
+            self._running = False
+
+    async def _run_(self, event, from_state, resume):
+        # [ <first>
+        tracer = self.tracer
+        try:
+            if self._dispatch is None:
+                self.compile()
+            dispatch = self._dispatch
+            many = getattr(self, "fetch_many", None)
+            fetch = self.fetch
+            wait = iscoroutinefunction(fetch)
+            if resume:
+                if isinstance(self._state, Machine) and self._state._resuming:
+                    result = self._state._resume_()
+                    if result is not None and isawaitable(result):
+                        await result
+            else:
+                # Enter into first state instance
+                self._state = self._first
+                event = START if event is None else Start(event)
+                if tracer is not None:
+                    tracer.trace(TraceRecord("enter", self, self._state, event, self, None, perf_counter()))
+                result = self._state._enter_(event, self)
+                if result is not None and isawaitable(result):
+                    await result
+        except StopMachine as e:
+            if self._observers:
+                if tracer is not None:
+                    tracer.trace(TraceRecord("stop", self, self._state, e.event, None, None, perf_counter()))
+                # Machines' transitions then has to contain Exit transition
+                await self.notify_all(EXIT if e.event is None else Exit(e.event))
+            else:
+                if tracer is not None:
+                    tracer.trace(TraceRecord("stop", self, self._state, e.event, None, None, perf_counter()))
+                result = self._exit_(e.event, None, None)
+                if result is not None and isawaitable(result):
+                    await result
+            return
+        except BaseException as e:
+            if self._observers:
+                raise
+            else:
+                if tracer is not None:
+                    tracer.trace(TraceRecord("stop", self, self._state, None, None, e, perf_counter()))
+                result = self._exit_(None, None, e)
+                if result is not None and isawaitable(result):
+                    result = await result
+                if result is None:
+                    raise
+        # ] <first>
+        # [ <loop>
+        table = dispatch[self._state]
+        kind = hook = None
+        pending = None
+        while True:
+            try:
+                try:
+                    # Get next event
+                    if many is None:
+                        if wait:
+                            event = await fetch()
+                        else:
+                            event = fetch()
+                    elif pending:
+                        event = pending.popleft()
+                    else:
+                        # Next batch, the source's own deque
+                        pending = many()
+                        if isawaitable(pending):
+                            pending = await pending
+                        if not isinstance(pending, deque):
+                            raise TypeError("fetch_many: deque expected, not " + type(pending).__name__)
+                        continue
+                    if event is None:
+                        continue
+                    try:
+                        kind, target, hook = table[type(event)]
+                    except KeyError as e:
+                        if self._dispatch is not dispatch:
+                            # Transitions changed, tables rebuilt
+                            dispatch, table = self._reload_()
+                        if type(event) not in table:
+                            e.args = (Message(e.args[0], "   Missing: ", type(event).__name__,
+                                              " in: ", type(self._state).__name__,
+                                              " transitions: ", self.graph(self._state)),)
+                            raise
+                        kind, target, hook = table[type(event)]
+                    if kind == ENTER:
+                        state = target
+                    elif kind == CALL:
+                        result = target(event)
+                        if result is not None and isawaitable(result):
+                            await result
+                        if self._dispatch is not dispatch:
+                            dispatch, table = self._reload_()
+                        continue
+                    elif kind == STOP:
+                        if hook is not None:
+                            result = hook(event)
+                            if result is not None and isawaitable(result):
+                                await result
+                        raise StopMachine(event)
+                    else:
+                        raise hook(target)
+                except StopMachine as e:
+                    # Controlled state exit then machine stop
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("exit", self, self._state, e.event, self, None, perf_counter()))
+                    result = self._state._exit_(e.event, self, None)
+                    if result is not None and isawaitable(result):
+                        await result
+                    raise
+                except BaseException as e:
+                    # Controlled state exit
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("exit", self, self._state, None, self, e, perf_counter()))
+                    result = self._state._exit_(None, self, e)
+                    if result is not None and isawaitable(result):
+                        result = await result
+                    if result is None:
+                        raise
+                else:
+                    # Next state then exit current state
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("exit", self, self._state, event, state, None, perf_counter()))
+                    result = self._state._exit_(event, state, None)
+                    if result is not None and isawaitable(result):
+                        await result
+                # Begin transition
+                from_state = self._state
+                if tracer is not None:
+                    tracer.trace(TraceRecord("transition", self, from_state, event, state, None, perf_counter()))
+                self._state = None
+                if hook is not None:
+                    result = hook(event, from_state, state)
+                    if result is not None and isawaitable(result):
+                        await result
+                # End transition entering in next state
+                self._state = state
+                table = dispatch[state]
+                if tracer is not None:
+                    tracer.trace(TraceRecord("enter", self, self._state, event, from_state, None, perf_counter()))
+                result = self._state._enter_(event, from_state)
+                if result is not None and isawaitable(result):
+                    await result
+                if self._dispatch is not dispatch:
+                    dispatch, table = self._reload_()
+            except StopMachine as e:
+                if self._observers:
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("stop", self, self._state, e.event, self, None, perf_counter()))
+                    await self.notify_all(EXIT if e.event is None else Exit(e.event))
+                else:
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("stop", self, self._state, e.event, self, None, perf_counter()))
+                    result = self._exit_(e.event, self, None)
+                    if result is not None and isawaitable(result):
+                        await result
+                return
+            except BaseException as e:
+                if self._observers:
+                    raise
+                else:
+                    if tracer is not None:
+                        tracer.trace(TraceRecord("stop", self, self._state, None, None, e, perf_counter()))
+                    result = self._exit_(None, None, e)
+                    if result is not None and isawaitable(result):
+                        result = await result
+                    if result is None:
+                        raise
+        # ] <loop>
+
+    async def start(self, event=None, from_state=None):
+        if self.tracer is not None:
+            self.tracer.trace(TraceRecord("start", self, None, event, from_state, None, perf_counter()))
+        await self._enter_(event, from_state)
+        return self
+
+    async def resume(self):
+        if self._state is None:
+            return await self.start()
+        if self.tracer is not None:
+            self.tracer.trace(TraceRecord("start", self, self._state, None, None, None, perf_counter()))
+        await self._resume_()
+        return self
+
+
 if __name__ == "__main__":
+    from sys import argv
     from queue import Queue
 
+    if "--trace" in argv:
+        Machine.tracer = PrintTracer()
+    if "--flat" in argv:
+        Machine.flat = True
+
 
     class Next(Event):
         pass
@@ -419,3 +1351,55 @@ if __name__ == "__main__":
             Starter: {Start: Startup}
         }
     ).start()
+
+    print("############################################################")
+
+    import asyncio
+
+
+    class AsyncQueueObserver:
+        def notify(self, event):
+            self.queue.put_nowait(event)
+
+        async def fetch(self):
+            return await self.queue.get()
+
+
+    class Startup(AsyncState):
+        async def _enter_(self, event, state):
+            await asyncio.sleep(0)
+            await self.notify_all(Next())
+
+
+    class Mutex(AsyncQueueObserver, AsyncMachine):
+        pass
+
+
+    class Starter(AsyncQueueObserver, AsyncMachine):
+        pass
+
+
+    async def main(machines):
+        # Thousands of machines, one event loop
+        tasks = []
+        for i in range(machines):
+            mutex = Mutex([LaunchCondition(), Launch()],
+                          {
+                              Mutex: {Start: LaunchCondition},
+                              LaunchCondition: {Next: Launch},
+                              Launch: {Next: Mutex},
+                          })
+            starter = Starter(
+                [Startup(), AbortCondition(), mutex],
+                {
+                    Startup: {Next: AbortCondition},
+                    AbortCondition: {No: Mutex, Yes: Starter},
+                    Mutex: {Start: LaunchCondition, Exit: AbortCondition},
+                    Starter: {Start: Startup}
+                })
+            mutex.queue = starter.queue = asyncio.Queue()
+            tasks.append(starter.start())
+        print(len(await asyncio.gather(*tasks)), "machines stopped")
+
+
+    asyncio.run(main(1000))
@@ -0,0 +1,138 @@
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count
+from os.path import splitext
+from time import perf_counter
+
+from filldict import block_getter, compile_template, plan, csv_rows, xlsx_rows
+
+
+Filled = namedtuple("Filled", "path result error open fill")
+
+
+def open_csv(path):
+    from csv import reader
+    with open(path, newline="") as f:
+        return block_getter(list(reader(f)))
+
+
+def open_xlrd(path, sheet=0):
+    import xlrd
+    book = xlrd.open_workbook(path)
+    if isinstance(sheet, str):
+        return block_getter(book.sheet_by_name(sheet))
+    return block_getter(book.sheet_by_index(sheet))
+
+
+def open_sheet(path):
+    # Getter by file extension, csv or xlrd workbooks first sheet
+    if splitext(path)[1].lower() == ".csv":
+        return open_csv(path)
+    return open_xlrd(path)
+
+
+def open_rows(path):
+    # Streamed row source by file extension, csv or xlsx
+    if splitext(path)[1].lower() == ".csv":
+        return csv_rows(path)
+    return xlsx_rows(path)
+
+
+_plan = _open = None
+
+
+def _init(template_plan, opener):
+    global _plan, _open
+    _plan = template_plan
+    _open = opener
+
+
+def _fill(path):
+    begin = perf_counter()
+    try:
+        source = _open(path)
+        opened = perf_counter()
+        # Getters or row sources
+        result = _plan.fill(source) if callable(source) else _plan.fill_stream(source)
+    except Exception as e:
+        return Filled(path, None, repr(e), perf_counter() - begin, 0.0)
+    return Filled(path, result, None, opened - begin, perf_counter() - opened)
+
+
+def fill_many(template, paths, opener=open_sheet, workers=None, in_flight=None, ordered=True):
+    """
+    Fill template against every workbook in paths in worker processes.
+
+       template   - filldict template or compile_template plan. Its
+                    getters are replaced by each file getter.
+       paths      - iterable of files, consumed as workers free up.
+       opener     - opener(path) returns a getter, default open_sheet,
+                    or a row source like open_rows, streamed.
+       workers    - processes, default cpu_count().
+       in_flight  - files submitted and not yielded, default 2 * workers.
+       ordered    - yield in paths order, else as completed.
+
+    Yields Filled(path, result, error, open, fill), error is the repr
+    of the exception raised opening or filling, open and fill seconds.
+    Where fork is available template and opener are inherited by
+    workers, lambdas included, otherwise they must be picklable.
+    """
+    if not isinstance(template, plan):
+        template = compile_template(template)
+    workers = workers or cpu_count() or 1
+    in_flight = in_flight or 2 * workers
+    context = get_context("fork") if "fork" in get_all_start_methods() else None
+    paths = iter(paths)
+    with ProcessPoolExecutor(workers, context, _init, (template, opener)) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(_fill, path))
+            if len(pending) >= in_flight:
+                break
+        while pending:
+            if ordered:
+                done = [pending.popleft().result()]
+            else:
+                finished, running = wait(pending, return_when=FIRST_COMPLETED)
+                pending = deque(future for future in pending if future in running)
+                done = [future.result() for future in finished]
+            for path in paths:
+                pending.append(executor.submit(_fill, path))
+                if len(pending) >= in_flight:
+                    break
+            yield from done
+
+
+if __name__ == "__main__":
+    from csv import writer
+    from os.path import join
+    from tempfile import TemporaryDirectory
+    from filldict import cell
+
+    def g(x, y):
+        return None
+
+    # Names column and their values, from every file
+    template = {
+        cell(["a2", ..., "a1001"], g): [cell((1, 1), g, rel=True, func=float),
+                                         cell((2, 1), g, rel=True, func=float)]
+    }
+    with TemporaryDirectory() as directory:
+        paths = []
+        for i in range(200):
+            paths.append(join(directory, "book%03d.csv" % i))
+            with open(paths[-1], "w", newline="") as f:
+                writer(f).writerows([["name", "min", "max"]]
+                                    + [["item%d" % j, i, i + j] for j in range(1000)])
+        begin = perf_counter()
+        template_plan = compile_template(template)
+        for path in paths:
+            template_plan.fill(open_csv(path))
+        sequential = perf_counter() - begin
+        begin = perf_counter()
+        slowest = max(fill_many(template, paths), key=lambda filled: filled.open + filled.fill)
+        print("sequential: %.3fs   fill_many: %.3fs   slowest file: %s %.4fs"
+              % (sequential, perf_counter() - begin, slowest.path, slowest.open + slowest.fill))
+        first = next(fill_many(template, paths[:1]))
+        print(first.result["item999"], first.error)
@@ -1,5 +1,10 @@
-from collections import Iterable
-from itertools import product
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterable
+from contextvars import ContextVar
+from functools import lru_cache
+from itertools import islice, product
+from math import isnan, nan
 
 
 class iter_inf:
@@ -15,7 +20,9 @@ class iter_ell:
     def __init__(self, ellipsis):
         self.ellipsis = ellipsis
 
-    def __iter__(self):
+    def segments(self):
+        # (point, None) or (cell_range, points to skip) for ellipsis
+        # and "A1:C3" ranges
         ellipsis = False
         for item in self.ellipsis:
             if item is Ellipsis:
@@ -23,23 +30,214 @@ class iter_ell:
                 continue
             if ellipsis:
                 ellipsis = False
-                beg = cell.coord(last)
-                end = cell.coord(item)
-                inc = [ 1 if b <= e else -1 for b, e in zip(beg, end) ]
-                points = []
-                for b, e, i in zip(beg, end, inc):
-                    points.append([])
-                    for var in range(b, e + i, i):
-                        points[-1].append(var)
-                for comb in product(*points):
-                    yield comb
+                # First point is last item, already yielded
+                yield cell_range(last, item), 1
             else:
-                yield item
+                if isinstance(item, str) and ":" in item:
+                    item = cell_range(item)
+                if isinstance(item, cell_range):
+                    yield item, 0
+                    # Ellipsis after a range goes on from its last point
+                    item = item.last
+                else:
+                    yield item, None
             last = item
 
+    def __iter__(self):
+        for item, skip in self.segments():
+            if skip is None:
+                yield item
+            else:
+                yield from islice(item, skip, None)
+
+    def __len__(self):
+        return sum(1 if skip is None else len(item) - skip
+                   for item, skip in self.segments())
+
+    def values(self, get):
+        # (point, value) pairs. Ranges read with one get.get_block
+        # call, _unread if out of range.
+        read = _reader()
+        for item, skip in self.segments():
+            if skip is None:
+                point = cell.coord(item)
+                try:
+                    yield point, read(get, point)
+                except IndexError:
+                    yield point, _unread
+            else:
+                x0, y0, x1, y1 = item.bounds
+                block = get.get_block(x0, y0, x1, y1)
+                for point in islice(item, skip, None):
+                    try:
+                        yield point, block[point[1] - y0][point[0] - x0]
+                    except IndexError:
+                        yield point, _unread
+
+
+_COLUMNS = {letter: i + 1 for i, letter in enumerate("ABCDEFGHIJKLMNOPQRSTUVWXYZ")}
+_COLUMNS.update({letter.lower(): i for letter, i in _COLUMNS.items()})
+
+
+@lru_cache(maxsize=1 << 16)
+def a1(point):
+    # "B3" as (col, row), (1, 2)
+    letters = point.rstrip("0123456789")
+    col = 0
+    for letter in letters:
+        col = col * 26 + _COLUMNS[letter]
+    return col - 1, int(point[len(letters):]) - 1
+
+
+@lru_cache(maxsize=None)
+def _letters(letters):
+    # Column of "AB" letters
+    return a1(letters + "1")[0]
+
+
+class cell_range:
+    """
+    Rectangle of points from first to last corner, both included, in
+    iter_ell order. Corners as A1 strings or (col, row) points, or a
+    single "A1:C100" string. Length and membership without points.
+    """
+    def __init__(self, first, last=None):
+        if last is None:
+            first, last = first.split(":")
+        self.first = cell.coord(first)
+        self.last = cell.coord(last)
+        self.steps = tuple(1 if b <= e else -1 for b, e in zip(self.first, self.last))
+
+    @property
+    def bounds(self):
+        # x0, y0, x1, y1
+        (x0, y0), (x1, y1) = self.first, self.last
+        return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+    def __len__(self):
+        length = 1
+        for b, e in zip(self.first, self.last):
+            length *= abs(e - b) + 1
+        return length
+
+    def __contains__(self, point):
+        point = cell.coord(point)
+        return len(point) == len(self.first) and all(
+            min(b, e) <= p <= max(b, e) for p, b, e in zip(point, self.first, self.last))
+
+    def __iter__(self):
+        return product(*( range(b, e + i, i) for b, e, i in zip(self.first, self.last, self.steps) ))
+
+    def __repr__(self):
+        return "cell_range(%r, %r)" % (self.first, self.last)
+
+
+_unread = object()
+_outside = object()
+_cache = ContextVar("filldict_cache", default=None)
+
+
+class cell_cache:
+    """
+    LRU cache of getters' reads keyed by (getter, point).
+
+       size  - reads kept, least recently used evicted first.
+
+    fill and ifill read cells through the one passed as cache, for
+    templates reading the same cells again, else directly. hits and
+    misses count reads, getter(get) wraps get to read through it.
+    """
+    def __init__(self, size=1 << 16):
+        self.size = size
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, get, point):
+        key = (get, point)
+        values = self.values
+        value = values.get(key, _unread)
+        if value is _unread:
+            self.misses += 1
+            try:
+                value = get(*point)
+            except IndexError:
+                value = _outside
+            values[key] = value
+            if len(values) > self.size:
+                values.popitem(last=False)
+        else:
+            self.hits += 1
+            values.move_to_end(key)
+        if value is _outside:
+            raise IndexError(point)
+        return value
+
+    def getter(self, get):
+        return lambda *point: self.read(get, point)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.values)}
+
+
+def _direct(get, point):
+    return get(*point)
+
+
+def _reader():
+    # Read function of the active cache
+    cache = _cache.get()
+    return _direct if cache is None else cache.read
+
+
+def _using(cache):
+    # Cache of a fill call: passed one or the active one, None reads
+    # directly
+    if cache is None:
+        cache = _cache.get()
+    return cache or None
+
+
+def _same(x):
+    return x
+
+
+class block_getter:
+    # Getter with get_block(x0, y0, x1, y1), rows y0 to y1 of columns
+    # x0 to x1 in one read, over an xlrd sheet, a NumPy 2d array or a
+    # list of rows. Rows miss out of range values.
+    def __init__(self, source):
+        self.source = source
+        if hasattr(source, "row_values"):
+            self.kind = "sheet"
+        elif hasattr(source, "ndim"):
+            self.kind = "array"
+        else:
+            self.kind = "rows"
+
+    def __call__(self, x, y):
+        if self.kind == "sheet":
+            return self.source.cell_value(rowx=y, colx=x)
+        if self.kind == "array":
+            return self.source[y, x]
+        return self.source[y][x]
+
+    def get_block(self, x0, y0, x1, y1):
+        if self.kind == "sheet":
+            return [ self.source.row_values(y, x0, x1 + 1)
+                     for y in range(y0, min(y1 + 1, self.source.nrows)) ]
+        if self.kind == "array":
+            return self.source[y0:y1 + 1, x0:x1 + 1]
+        return [ row[x0:x1 + 1] for row in self.source[y0:y1 + 1] ]
+
 
 class cell:
-    def __init__(self, point, get=None, rel=False, func=lambda x: x, cond=None):
+    # Value already read by a range or cond scan
+    raw = _unread
+
+    def __init__(self, point, get=None, rel=False, func=_same, cond=None):
+        if isinstance(point, cell_range) or isinstance(point, str) and ":" in point:
+            point = [point]
         if isinstance(point, (str, tuple)):
             self.point = cell.coord(point)
             if get:
@@ -66,48 +264,56 @@ class cell:
             self.unique = False
         self.cond = cond
 
+    def _reads(self):
+        # (point, get, raw value or _unread, rel, func, first point)
+        # of expanded points passing cond
+        if isinstance(self.gets, iter_inf) and hasattr(self.gets.always, "get_block"):
+            # Whole ranges in one read
+            get = self.gets.always
+            reads = ( (point, get, value) for point, value in self.points.values(get) )
+        else:
+            reads = ( (cell.coord(point), get, _unread)
+                      for point, get in zip(self.points, self.gets) )
+        read = _reader()
+        first_point = None
+        for (point, get, raw), rel, func in zip(reads, self.rels, self.funcs):
+            if not first_point:
+                first_point = point
+            if self.cond:
+                if raw is _unread:
+                    raw = read(get, point)
+                if not self.cond(raw):
+                    continue
+            yield point, get, raw, rel, func, first_point
+
     def __iter__(self):
         if self.unique:
             yield self
-        elif self.cond:
-            first_point = None
-            for point, get, rel, func in zip(self.points,
-                                             self.gets,
-                                             self.rels,
-                                             self.funcs):
-                point = cell.coord(point)
-                if not first_point:
-                    first_point = point
-                if self.cond(get(*point)):
-                    c = cell(point, get, rel=rel, func=func)
-                    c.first_point = first_point
-                    yield c
-        else:
-            first_point = None
-            for point, get, rel, func in zip(self.points,
-                                             self.gets,
-                                             self.rels,
-                                             self.funcs):
-                point = cell.coord(point)
-                if not first_point:
-                    first_point = point
-                c = cell(point, get, rel=rel, func=func)
-                c.first_point = first_point
-                yield c
+            return
+        for point, get, raw, rel, func, first_point in self._reads():
+            c = cell(point, get, rel=rel, func=func)
+            c.raw = raw
+            c.first_point = first_point
+            yield c
+
+    def values(self):
+        # Expanded cells' values without cell objects
+        if self.unique:
+            yield self.value()
+            return
+        read = _reader()
+        for point, get, raw, rel, func, first_point in self._reads():
+            try:
+                if raw is _unread:
+                    raw = read(get, point)
+                yield func(raw)
+            except IndexError:
+                yield None
 
     @staticmethod
     def coord(point):
         if isinstance(point, str):
-            i = 0
-            while point[i] not in "0123456789":
-                i += 1
-            row = int(point[i:]) - 1
-            col = -1
-            factor = 1
-            for l in point[:i].upper()[::-1]:
-                col += factor * (ord(l) - 64)
-                factor *= 26
-            return col, row
+            return a1(point)
         return point
 
     @staticmethod
@@ -116,15 +322,20 @@ class cell:
 
     def value(self):
         try:
-            return self.func(self.get(*self.point))
+            raw = self.raw
+            if raw is _unread:
+                raw = _reader()(self.get, self.point)
+            return self.func(raw)
         except IndexError:
             return None
 
     def set(self, t):
         if isinstance(t, cell):
             if t.rel or self.rel:
+                # Single point keys move nothing
+                first_point = getattr(self, "first_point", self.point)
                 return cell(tuple(
-                    t.point[i] + self.point[i] - self.first_point[i]
+                    t.point[i] + self.point[i] - first_point[i]
                     for i in range(len(t.point))),
                             self.get, rel=t.rel,
                             func=t.func)
@@ -133,7 +344,7 @@ class cell:
                     t.get = self.get
                 return t
         if isinstance(t, dict):
-            return { self.set(k): self.set(v) for k, v in expand(t) }
+            return _expanded( (self.set(k), self.set(v)) for k, v in expand(t) )
         if isinstance(t, set):
             return { self.set(v) for v in expand(t) }
         if isinstance(t, list):
@@ -143,8 +354,16 @@ class cell:
         return t
 
 
+class _expanded(dict):
+    # set() result, keys already expanded and values set. Expanding
+    # it again would move values twice.
+    pass
+
+
 def expand(template):
-    if isinstance(template, dict):
+    if isinstance(template, _expanded):
+        yield from template.items()
+    elif isinstance(template, dict):
         for k, v in template.items():
             if isinstance(k, cell):
                 for item in k:
@@ -160,16 +379,524 @@ def expand(template):
                 yield v
 
 
-def fill(template):
+def fill(template, cache=None):
+    cache = _using(cache)
+    if cache is _cache.get():
+        return _fill(template)
+    token = _cache.set(cache)
+    try:
+        return _fill(template)
+    finally:
+        _cache.reset(token)
+
+
+def _fill(template):
     if isinstance(template, cell):
         return template.value()
     if isinstance(template, dict):
-        return { fill(k): fill(v) for k, v in expand(template) }
+        return { _fill(k): _fill(v) for k, v in expand(template) }
     if isinstance(template, set):
-        return { fill(v) for v in expand(template) }
+        return set(_fill_items(template))
     if isinstance(template, list):
-        return [ fill(v) for v in expand(template) ]
+        return list(_fill_items(template))
     if isinstance(template, tuple):
-        print(template)
-        return tuple( fill(v) for v in expand(template) )
+        return tuple(_fill_items(template))
     return template
+
+
+def _fill_items(template):
+    # fill of expand(template) items, cells' values read directly
+    for v in template:
+        if isinstance(v, cell):
+            yield from v.values()
+        else:
+            yield _fill(v)
+
+
+def ifill(template, lazy=False, cache=None):
+    # Generator of fill(template) top level entries, (key, value) for
+    # dicts, as expand produces them. lazy yields nested dicts, sets,
+    # lists and tuples as ifill generators too, filled when iterated.
+    cache = _using(cache)
+    entries = _ifill(template, lazy, cache)
+    while True:
+        # Cache active only while producing entries
+        token = _cache.set(cache)
+        try:
+            entry = next(entries)
+        except StopIteration:
+            return
+        finally:
+            _cache.reset(token)
+        yield entry
+
+
+def _ifill(template, lazy, cache):
+    if isinstance(template, cell) and template.unique:
+        yield template.value()
+        return
+
+    def nested(v):
+        if lazy and _container(v):
+            return ifill(v, lazy, cache if cache else False)
+        return _fill(v)
+    if isinstance(template, dict):
+        for k, v in expand(template):
+            yield _fill(k), nested(v)
+    else:
+        for v in template:
+            if isinstance(v, cell):
+                yield from v.values()
+            else:
+                yield nested(v)
+
+
+# Largest ints floats keep exactly
+_EXACT = 1 << 53
+
+
+class column:
+    """
+    Typed column appended value by value: array("q") while values are
+    ints, array("d") once floats or None show up, None as NaN, and a
+    list for any other value, bools and ints a float would round
+    included. Buffers are NumPy and pyarrow ready.
+
+       data   - array or list, None until a value other than None.
+       count  - values appended.
+    """
+    def __init__(self, missing=0):
+        self.data = None
+        self.count = missing
+
+    def append(self, value):
+        data = self.data
+        self.count += 1
+        if data is None:
+            if value is None:
+                return
+            self.data = data = self._first(value, self.count - 1)
+        if data.__class__ is list:
+            data.append(value)
+            return
+        if value is True or value is False or value.__class__ is int \
+                and data.typecode == "d" and not -_EXACT <= value <= _EXACT:
+            self._widen(value)
+            return
+        try:
+            data.append(value)
+        except (TypeError, OverflowError):
+            self._widen(value)
+
+    @staticmethod
+    def _first(value, missing):
+        if isinstance(value, bool):
+            return [None] * missing
+        if isinstance(value, float) or isinstance(value, int) and missing and -_EXACT <= value <= _EXACT:
+            return array("d", [nan] * missing)
+        if isinstance(value, int) and not missing:
+            return array("q")
+        return [None] * missing
+
+    def _widen(self, value):
+        data = self.data
+        if value is None or isinstance(value, float):
+            if data.typecode == "q" and all(-_EXACT <= v <= _EXACT for v in data):
+                data = self.data = array("d", data)
+            if data.typecode == "d":
+                data.append(nan if value is None else value)
+                return
+        self.data = [ None if isinstance(v, float) and isnan(v) else v for v in data ] \
+            if data.typecode == "d" else list(data)
+        self.data.append(value)
+
+    def values(self, numpy=False):
+        data = self.data
+        if data is None:
+            data = [None] * self.count
+        if not numpy:
+            return data
+        from numpy import array as ndarray, frombuffer
+        if isinstance(data, list):
+            return ndarray(data, dtype=object)
+        return frombuffer(data, dtype="i8" if data.typecode == "q" else "f8")
+
+
+def fill_columns(template, numpy=False, cache=None, key="key"):
+    # Columnar fill(template): {name: column values}. Dict templates
+    # give a key column, entries' values as records go to a column
+    # per dict key or tuple and list position, other values to a
+    # "value" column. Records with a field named as the key column
+    # raise ValueError. Missing fields are None. numpy gives NumPy
+    # arrays, else array.array or list.
+    columns = {}
+    rows = 0
+    entries = ifill(template, cache=cache)
+    for entry in entries:
+        if isinstance(template, dict):
+            entry_key, entry = entry
+            fields = [(key, entry_key)]
+        else:
+            fields = []
+        if isinstance(entry, dict):
+            if fields and key in entry:
+                raise ValueError("fill_columns: %r field of %r is the key column" % (key, fields[0][1]))
+            fields.extend(entry.items())
+        elif isinstance(entry, (list, tuple)):
+            fields.extend(enumerate(entry))
+        else:
+            if fields and key == "value":
+                raise ValueError("fill_columns: 'value' column is the key column")
+            fields.append(("value", entry))
+        for name, value in fields:
+            try:
+                columns[name].append(value)
+            except KeyError:
+                columns[name] = column(rows)
+                columns[name].append(value)
+        rows += 1
+        if len(fields) < len(columns):
+            for c in columns.values():
+                if c.count < rows:
+                    c.append(None)
+    return {name: c.values(numpy) for name, c in columns.items()}
+
+
+def _container(template):
+    return isinstance(template, (dict, set, list, tuple))
+
+
+SLOT, CONST, DICT, SET, LIST, TUPLE = range(6)
+
+
+class plan:
+    """
+    Compiled template, compile_template(template) returns it.
+
+       xs, ys   - flat lists of slot coordinates, relative offsets
+                  applied. One slot per cell read.
+       gets     - index of slots' getter in getters.
+       getters  - template getters.
+       funcs    - slots' transforms.
+
+    fill(get) reads every slot with get, or template getters if None,
+    and builds the result as fill(template) does. Cells with cond are
+    checked against their raw value, out of range ones skipped. Cells
+    nested in expanded keys' values are shifted at compile time, their
+    cond checks their own point, as fill does. Nothing is read then.
+    refill(changed) reads again only slots of changed points.
+    """
+    def __init__(self, template):
+        self.xs = []
+        self.ys = []
+        self.gets = []
+        self.getters = []
+        self.funcs = []
+        self._getters = {}
+        self._index = None
+        self._last = None
+        self.build = _builder(self._compile(template))
+
+    def slot(self, c, point=None, get=None):
+        # Slot reading c, at point with get if given
+        get = c.get if get is None else get
+        try:
+            index = self._getters[id(get)]
+        except KeyError:
+            index = self._getters[id(get)] = len(self.getters)
+            self.getters.append(get)
+        x, y = c.point if point is None else point
+        self.xs.append(x)
+        self.ys.append(y)
+        self.gets.append(index)
+        self.funcs.append(c.func)
+        return len(self.xs) - 1
+
+    def _points(self, c, shifts=()):
+        # Expanded cells of c, as cell.__iter__, their slot and the
+        # slot cond checks, without reading them. shifts, the set()
+        # of enclosing keys, move slots, cond checks c own points as
+        # fill does.
+        if c.unique:
+            slot = self.slot(c, *_shift(c, c.point, c.get, shifts))
+            yield c, slot, slot
+            return
+        first_point = None
+        for point, get, rel, func in zip(c.points, c.gets, c.rels, c.funcs):
+            point = cell.coord(point)
+            if not first_point:
+                first_point = point
+            item = cell(point, get, rel=rel, func=func)
+            item.first_point = first_point
+            shifted = _shift(item, point, get, shifts)
+            slot = self.slot(item, *shifted)
+            if c.cond is None or shifted == (point, get):
+                yield item, slot, slot
+            else:
+                yield item, slot, self.slot(cell(point, get), point, get)
+
+    def _compile(self, template, shifts=()):
+        # Nodes: (SLOT, index), (CONST, value), (DICT, entries) and
+        # (SET | LIST | TUPLE, entries). Entries carry cond and the
+        # slot it checks, None without cond. Values of expanded keys
+        # compile with their shift, as key.set(value) without reading.
+        if isinstance(template, cell):
+            return (SLOT, self.slot(template, *_shift(template, template.point, template.get, shifts)))
+        if isinstance(template, dict):
+            entries = []
+            for k, v in template.items():
+                if isinstance(k, cell):
+                    # fill ignores cond of single point cells
+                    cond = None if k.unique else k.cond
+                    for item, slot, check in self._points(k, shifts):
+                        offset = tuple(p - f for p, f in zip(
+                            item.point, getattr(item, "first_point", item.point)))
+                        entries.append((cond, check, (SLOT, slot),
+                                        self._compile(v, ((offset, item.get, item.rel),) + shifts)))
+                else:
+                    entries.append((None, None, self._compile(k, shifts), self._compile(v, shifts)))
+            return (DICT, entries)
+        for kind, types in ((SET, set), (LIST, list), (TUPLE, tuple)):
+            if isinstance(template, types):
+                entries = []
+                for v in template:
+                    if isinstance(v, cell):
+                        cond = None if v.unique else v.cond
+                        for item, slot, check in self._points(v, shifts):
+                            entries.append((cond, check, (SLOT, slot)))
+                    else:
+                        entries.append((None, None, self._compile(v, shifts)))
+                return (kind, entries)
+        return (CONST, template)
+
+    def read(self, get=None):
+        # Slots' raw values, _unread out of range, and values
+        getters = self.getters if get is None else [get] * len(self.getters)
+        raws = []
+        values = []
+        for x, y, index, func in zip(self.xs, self.ys, self.gets, self.funcs):
+            try:
+                raw = getters[index](x, y)
+            except IndexError:
+                raws.append(_unread)
+                values.append(None)
+                continue
+            raws.append(raw)
+            if func is _same:
+                values.append(raw)
+                continue
+            try:
+                values.append(func(raw))
+            except IndexError:
+                values.append(None)
+        return values, raws
+
+    def fill(self, get=None):
+        values, raws = self._last = self.read(get)
+        return self.build(values, raws)
+
+    def index(self):
+        # {(x, y): slots reading it}, rel offsets and cond cells
+        # included
+        if self._index is None:
+            self._index = {}
+            for slot, point in enumerate(zip(self.xs, self.ys)):
+                self._index.setdefault(point, []).append(slot)
+        return self._index
+
+    def refill(self, changed, get=None):
+        # Last fill result with changed points, A1 or (x, y), read
+        # again. Other slots keep their values, cond checks run again.
+        if self._last is None:
+            return self.fill(get)
+        values, raws = self._last
+        getters = self.getters if get is None else [get] * len(self.getters)
+        index = self.index()
+        for point in changed:
+            for slot in index.get(cell.coord(point), ()):
+                func = self.funcs[slot]
+                try:
+                    raw = getters[self.gets[slot]](self.xs[slot], self.ys[slot])
+                except IndexError:
+                    raws[slot] = _unread
+                    values[slot] = None
+                    continue
+                raws[slot] = raw
+                try:
+                    values[slot] = func(raw)
+                except IndexError:
+                    values[slot] = None
+        return self.build(values, raws)
+
+    def points(self):
+        # Every (x, y) the plan reads
+        return set(zip(self.xs, self.ys))
+
+    def fill_stream(self, rows):
+        # fill reading plan points from a row source in one pass
+        return self.fill(streamed(rows, self.points()))
+
+
+def compile_template(template):
+    return plan(template)
+
+
+def _shift(c, point, get, shifts):
+    # (point, get) of c after set() of each enclosing key, innermost
+    # first: shifts of (offset, get, rel)
+    for offset, key_get, rel in shifts:
+        if c.rel or rel:
+            point = tuple(p + o for p, o in zip(point, offset))
+            get = key_get
+    return point, get
+
+
+def diff(old, new):
+    # (x, y) points differing between two lists of rows, for refill
+    for y in range(max(len(old), len(new))):
+        old_row = old[y] if y < len(old) else ()
+        new_row = new[y] if y < len(new) else ()
+        if old_row == new_row:
+            continue
+        for x in range(max(len(old_row), len(new_row))):
+            if (old_row[x] if x < len(old_row) else _outside) \
+                    != (new_row[x] if x < len(new_row) else _outside):
+                yield x, y
+
+
+def fill_stream(template, rows):
+    # fill(template) from a row source, csv_rows or xlsx_rows, keeping
+    # only the cells template reads. Cells with cond are checked as in
+    # compile_template plans.
+    return compile_template(template).fill_stream(rows)
+
+
+class streamed:
+    """
+    Getter over a row source read once, forward, up to the last row
+    needed, keeping only needed cells.
+
+       rows    - iterable of (y, row), row[x] the value, in y order.
+       points  - (x, y) points to keep.
+
+    Other points raise IndexError, None when filled.
+    """
+    def __init__(self, rows, points):
+        wanted = {}
+        for x, y in points:
+            wanted.setdefault(y, []).append(x)
+        self.values = {}
+        last = max(wanted, default=-1)
+        for y, row in rows:
+            if y > last:
+                break
+            for x in wanted.get(y, ()):
+                try:
+                    self.values[(x, y)] = row[x]
+                except (IndexError, KeyError):
+                    pass
+        if hasattr(rows, "close"):
+            rows.close()
+
+    def __call__(self, x, y):
+        try:
+            return self.values[(x, y)]
+        except KeyError:
+            raise IndexError((x, y))
+
+
+def csv_rows(path, **kwargs):
+    # (y, row) of a csv file, kwargs for csv.reader
+    from csv import reader
+    with open(path, newline="") as f:
+        yield from enumerate(reader(f, **kwargs))
+
+
+_XLSX = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+def xlsx_rows(path, sheet=0):
+    # (y, {x: value}) of an xlsx sheet, by index or name, streamed from
+    # its XML. Numbers as floats, like xlrd.
+    from xml.etree.ElementTree import iterparse, parse
+    from zipfile import ZipFile
+    with ZipFile(path) as book:
+        sheets = parse(book.open("xl/workbook.xml")).getroot().find(_XLSX + "sheets")
+        sheets = [ (s.get("name"), s.get(_RELS + "id")) for s in sheets ]
+        rid = sheets[sheet][1] if isinstance(sheet, int) else dict(sheets)[sheet]
+        rels = parse(book.open("xl/_rels/workbook.xml.rels")).getroot()
+        target = next(r.get("Target") for r in rels if r.get("Id") == rid)
+        target = target.lstrip("/") if target.startswith("/") else "xl/" + target
+        strings = []
+        if "xl/sharedStrings.xml" in book.namelist():
+            for event, element in iterparse(book.open("xl/sharedStrings.xml")):
+                if element.tag == _XLSX + "si":
+                    strings.append("".join(t.text or "" for t in element.iter(_XLSX + "t")))
+                    element.clear()
+        y = -1
+        data = None
+        for event, element in iterparse(book.open(target), ("start", "end")):
+            if event == "start":
+                if element.tag == _XLSX + "sheetData":
+                    data = element
+                continue
+            if element.tag != _XLSX + "row":
+                continue
+            # Row and cell references are optional, next ones then
+            y = int(element.get("r", y + 2)) - 1
+            row = {}
+            x = -1
+            for c in element.iter(_XLSX + "c"):
+                ref = c.get("r")
+                x = _letters(ref.rstrip("0123456789")) if ref else x + 1
+                kind = c.get("t")
+                if kind == "inlineStr":
+                    row[x] = "".join(t.text or "" for t in c.iter(_XLSX + "t"))
+                    continue
+                v = c.find(_XLSX + "v")
+                if v is None:
+                    continue
+                if kind == "s":
+                    row[x] = strings[int(v.text)]
+                elif kind in ("str", "e"):
+                    row[x] = v.text
+                elif kind == "b":
+                    row[x] = v.text == "1"
+                else:
+                    row[x] = float(v.text)
+            # Read rows dropped, memory stays bounded
+            data.clear()
+            yield y, row
+
+
+def _builder(node):
+    # Function of (values, raws) building node's result
+    kind = node[0]
+    if kind == SLOT:
+        index = node[1]
+        return lambda values, raws: values[index]
+    if kind == CONST:
+        value = node[1]
+        return lambda values, raws: value
+    if kind == DICT:
+        items = [ (cond, slot, _builder(k), _builder(v)) for cond, slot, k, v in node[1] ]
+
+        def build(values, raws):
+            result = {}
+            for cond, slot, key, value in items:
+                if cond is None or raws[slot] is not _unread and cond(raws[slot]):
+                    result[key(values, raws)] = value(values, raws)
+            return result
+        return build
+    make = {SET: set, LIST: list, TUPLE: tuple}[kind]
+    entries = node[1]
+    slots = [ entry[2][1] for entry in entries if entry[0] is None and entry[2][0] == SLOT ]
+    if len(slots) == len(entries) and slots == list(range(slots[0], slots[0] + len(slots)) if slots else []):
+        # Contiguous unconditional cells, a slice
+        begin, end = (slots[0], slots[-1] + 1) if slots else (0, 0)
+        return lambda values, raws: make(values[begin:end])
+    items = [ (cond, slot, _builder(v)) for cond, slot, v in entries ]
+    return lambda values, raws: make(
+        value(values, raws) for cond, slot, value in items
+        if cond is None or raws[slot] is not _unread and cond(raws[slot]))
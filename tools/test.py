@@ -10,7 +10,10 @@ except ImportError:
         _internal.main(["install", "xlrd"])
         import xlrd
 
-from filldict import cell, fill
+from itertools import product
+
+from filldict import cell, fill, ifill, block_getter, compile_template, cell_cache, fill_columns, \
+    fill_stream, xlsx_rows
 
 
 book = xlrd.open_workbook("data.xlsx")
@@ -24,4 +27,58 @@ template = {
 }
 
 
-print(fill(template))
\ No newline at end of file
+print(fill(template))
+
+# Entries one by one, without building the whole dict
+for key, value in ifill(template):
+    print(key, value)
+
+# Ellipsis ranges read with one get_block call each
+print(fill([cell(["a3", ..., "c5"], block_getter(sheet))]))
+
+# Compiled once, filled against any sheet getter
+plan = compile_template(template)
+print(plan.fill(g))
+
+# Reads shared by overlapping cells, hits and misses
+cache = cell_cache()
+fill([template, template], cache=cache)
+print(cache.stats())
+
+# Range strings, points generated as iterated
+print(fill([cell("A3:C5", g)]))
+
+# {"key": names, 0: values} with typed array columns
+print(fill_columns(template))
+
+# One forward pass over the sheet XML, only template cells kept
+print(fill_stream(template, xlsx_rows("data.xlsx", "Limits")))
+
+# Compiled plans, refills and streamed fills give fill results, nested
+# keys, rel cells and cond included
+rows = [[(x * 7 + y * 3) % 11 for x in range(8)] for y in range(10)]
+
+def r(x, y):
+    return rows[y][x]
+
+def odd(v):
+    return v % 2 == 1
+
+checked = 0
+for rel, key_rel, inner_cond, outer_cond in product((False, True), (False, True), (None, odd), (None, odd)):
+    for t in (
+            {cell(["a1", ..., "a4"], r, rel=key_rel, cond=outer_cond):
+                 [cell(["b1", ..., "c1"], r, rel=rel, cond=inner_cond), cell((3, 0), r, rel=rel)]},
+            {cell(["a1", ..., "a3"], r, cond=outer_cond):
+                 {cell(["b1", ..., "b2"], r, rel=key_rel, cond=inner_cond): cell((2, 0), r, rel=rel),
+                  "t": (cell((4, 1), r, rel=rel),
+                        {cell(["d1", ..., "d2"], r, cond=inner_cond): cell((5, 0), r, rel=rel)})}},
+            [cell(["a1", ..., "c2"], r, cond=inner_cond), (cell("d4", r, cond=outer_cond), 5),
+             {cell("e1", r, cond=inner_cond): cell("e2", r)}]):
+        expected = fill(t)
+        checked_plan = compile_template(t)
+        assert checked_plan.fill() == expected, t
+        assert checked_plan.refill([(1, 1), "c2"]) == expected, t
+        assert fill_stream(t, enumerate(rows)) == expected, t
+        checked += 1
+print(checked, "templates: plans as fill")